@@ -12,5 +12,13 @@ box_config = {
 }
 
 app_config = {
-    "LOG_LEVEL": "DEBUG"
+    "LOG_LEVEL": "DEBUG",
+    "SHARE_BOX_TOKENS": False,
+    "MEDIA_CACHE_RETENTION_DAYS": 30,
+    "BOX_AI_CACHE_BYPASS": False,
+    "FFMPEG_LAYER_ARN": "",
+    "UPLOAD_VIDEO": False,
+    "TRANSCRIBE_MAX_CONCURRENT_JOBS": 100,
+    "TRANSCRIBE_LAMBDA_MAX_CONCURRENCY": 5,
+    "JOB_RETENTION_DAYS": 3
 }
\ No newline at end of file
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Lambda handlers.
+
+For each handler this runs a fresh interpreter with `-X importtime`, reports
+the heaviest top-level imports, and times init (module import) plus the first
+response to an event that takes the handler's early-return path. Exits with
+status 1 if any handler exceeds its init threshold.
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --handler process --max-init-ms 800 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Events that return without touching AWS or Box
+HANDLERS = {
+    'skill': {
+        'module': 'skill',
+        'event': {'body': '{}', 'headers': {}},
+        'max_init_ms': 400
+    },
+    'transcribe': {
+        'module': 'transcribe',
+        'event': {'Records': []},
+        'max_init_ms': 600
+    },
+    'process': {
+        'module': 'process',
+        'event': {'Records': [{'s3': {'object': {'key': 'transcriptions/job.json'}}}]},
+        'max_init_ms': 600
+    }
+}
+
+# Placeholder configuration so module-level setup runs offline
+HANDLER_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/000000000000/benchmark',
+    'JOB_TABLE': 'benchmark-jobs',
+    'STORAGE_BUCKET': 'benchmark-storage',
+    'TRANSCRIBE_BUCKET': 'benchmark-transcriptions',
+    'BOX_SKILL_SECRET_ARN': 'benchmark-skill-secret',
+    'BOX_DOCGEN_SECRET_ARN': 'benchmark-docgen-secret',
+    'LOG_LEVEL': 'ERROR'
+}
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module} as handler
+imported = time.perf_counter()
+response = handler.lambda_handler(json.loads(sys.argv[1]), None)
+responded = time.perf_counter()
+print(json.dumps({{
+    'init_ms': (imported - started) * 1000,
+    'first_response_ms': (responded - imported) * 1000,
+    'status': (response or {{}}).get('statusCode')
+}}))
+"""
+
+
+def parse_importtime(stderr, top):
+    """Returns the `top` heaviest top-level imports as (module, cumulative_ms)."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative_us, name = line.replace('import time:', '', 1).split('|')
+        # Nested imports are indented under their parent
+        if not name[1:].startswith(' '):
+            entries.append((name.strip(), int(cumulative_us) / 1000))
+    return sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+
+
+def measure(name, spec, top):
+    env = {**os.environ, **HANDLER_ENV, 'PYTHONPATH': os.path.join(ROOT, 'lambdas', name)}
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=spec['module']), json.dumps(spec['event'])],
+        capture_output=True, text=True, env=env, cwd=ROOT
+    )
+
+    if result.returncode != 0:
+        return {'handler': name, 'error': result.stderr.strip().splitlines()[-1] if result.stderr else 'failed'}
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'handler': name,
+        **timings,
+        'heaviest_imports': parse_importtime(result.stderr, top)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handler', choices=sorted(HANDLERS), action='append', help='handler(s) to measure, default all')
+    parser.add_argument('--max-init-ms', type=float, help='override the init threshold for every handler')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per handler; the fastest is reported')
+    parser.add_argument('--top', type=int, default=10, help='number of heaviest imports to list')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+
+    for name in args.handler or sorted(HANDLERS):
+        spec = HANDLERS[name]
+        runs = [measure(name, spec, args.top) for _ in range(args.runs)]
+        ok = [run for run in runs if 'error' not in run]
+        result = min(ok, key=lambda run: run['init_ms']) if ok else runs[0]
+
+        threshold = args.max_init_ms or spec['max_init_ms']
+        result['max_init_ms'] = threshold
+        result['regressed'] = 'error' in result or result['init_ms'] > threshold
+        failed = failed or result['regressed']
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            if 'error' in result:
+                print(f"{result['handler']}: ERROR {result['error']}")
+                continue
+            flag = 'REGRESSION' if result['regressed'] else 'ok'
+            print(f"{result['handler']}: init {result['init_ms']:.0f} ms (max {result['max_init_ms']:.0f}), "
+                  f"first response {result['first_response_ms']:.1f} ms, status {result['status']} [{flag}]")
+            for module, cumulative_ms in result['heaviest_imports']:
+                print(f"    {cumulative_ms:8.1f} ms  {module}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
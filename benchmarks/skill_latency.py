@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the skill Lambda handler.
+
+Reports p50/p99 handler latency for accepted, badly signed and unsupported
+file type invocations, warm (repeated calls in one interpreter) and cold
+(import plus first call in a fresh interpreter). Requests are signed with a
+generated key that is placed in the handler's secret cache, and the SQS
+client is replaced by an in-memory queue, so only the handler's own work is
+timed; Secrets Manager and SQS round trips are excluded. Exits with status 1
+if the warm p99 of accepted invocations exceeds --max-warm-p99-ms.
+
+    python benchmarks/skill_latency.py
+    python benchmarks/skill_latency.py --warm-runs 5000 --cold-runs 20 --json
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKILL_DIR = os.path.join(ROOT, 'lambdas', 'skill')
+
+SECRET_ARN = 'benchmark-skill-secret'
+
+HANDLER_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/000000000000/benchmark',
+    'BOX_SKILL_SECRET_ARN': SECRET_ARN,
+    'LOG_LEVEL': 'ERROR'
+}
+
+# Runs in a fresh interpreter; prints the cold latency of one invocation
+COLD_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import cache_util
+cache_util._secrets[{arn!r}] = (time.monotonic(), json.loads(sys.argv[1]))
+import skill
+skill.sqs = type('Queue', (), {{'send_message': lambda self, **kwargs: {{'MessageId': 'benchmark'}}}})()
+imported = time.perf_counter()
+response = skill.lambda_handler(json.loads(sys.argv[2]), None)
+responded = time.perf_counter()
+print(json.dumps({{
+    'init_ms': (imported - started) * 1000,
+    'handler_ms': (responded - imported) * 1000,
+    'status': response['statusCode']
+}}))
+"""
+
+
+class InMemoryQueue:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody):
+        self.messages.append(MessageBody)
+        return {'MessageId': str(len(self.messages))}
+
+
+def skill_event(key, file_name, signed=True):
+    body = json.dumps({
+        'id': 'request-1',
+        'skill': {'id': 'skill-1'},
+        'source': {'id': '1234', 'name': file_name, 'size': 1024 * 1024, 'parent': {'id': '0'}},
+        'token': {'read': {'access_token': 'read-token'}, 'write': {'access_token': 'write-token'}},
+        'event': {'created_by': {'id': '42'}}
+    })
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime())
+    digest = hmac.new(key.encode(), body.encode() + timestamp.encode(), hashlib.sha256).digest()
+
+    return {
+        'body': body,
+        'headers': {
+            'box-signature-version': '1',
+            'box-signature-algorithm': 'HmacSHA256',
+            'box-delivery-timestamp': timestamp,
+            'box-signature-primary': base64.b64encode(digest).decode() if signed else 'invalid',
+            'box-signature-secondary': 'invalid'
+        }
+    }
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return {
+        'p50_ms': statistics.median(ordered),
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        'runs': len(ordered)
+    }
+
+
+def measure_warm(credentials, events, runs):
+    os.environ.update(HANDLER_ENV)
+    sys.path.insert(0, SKILL_DIR)
+
+    import cache_util
+    cache_util._secrets[SECRET_ARN] = (time.monotonic(), credentials)
+
+    import skill
+    skill.sqs = InMemoryQueue()
+
+    results = {}
+    for name, (event, expected_status) in events.items():
+        # The first call pays for lazy setup and is not counted as warm
+        skill.lambda_handler(event, None)
+
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = skill.lambda_handler(event, None)
+            samples.append((time.perf_counter() - started) * 1000)
+
+        if response['statusCode'] != expected_status:
+            raise SystemExit(f"{name}: expected status {expected_status}, got {response['statusCode']}: {response['body']}")
+
+        results[name] = percentiles(samples)
+
+    return results
+
+
+def measure_cold(credentials, events, runs):
+    env = {**os.environ, **HANDLER_ENV, 'PYTHONPATH': SKILL_DIR}
+    results = {}
+
+    for name, (event, expected_status) in events.items():
+        init, handler = [], []
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, '-c', COLD_PROBE.format(arn=SECRET_ARN), json.dumps(credentials), json.dumps(event)],
+                capture_output=True, text=True, env=env, cwd=ROOT
+            )
+            if result.returncode != 0:
+                raise SystemExit(f"{name}: cold probe failed: {result.stderr.strip()}")
+
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            if timings['status'] != expected_status:
+                raise SystemExit(f"{name}: expected status {expected_status}, got {timings['status']}")
+            init.append(timings['init_ms'])
+            handler.append(timings['handler_ms'])
+
+        results[name] = {'init': percentiles(init), 'first_call': percentiles(handler)}
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--warm-runs', type=int, default=2000, help='invocations per scenario in the warm interpreter')
+    parser.add_argument('--cold-runs', type=int, default=10, help='fresh interpreters per scenario')
+    parser.add_argument('--max-warm-p99-ms', type=float, default=9.0, help='warm p99 threshold for accepted invocations')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    key = secrets.token_urlsafe(32)
+    credentials = {'client_id': 'benchmark', 'primary_key': key, 'secondary_key': secrets.token_urlsafe(32)}
+    events = {
+        'accepted': (skill_event(key, 'keynote.mp4'), 200),
+        'bad_signature': (skill_event(key, 'keynote.mp4', signed=False), 403),
+        'unsupported_type': (skill_event(key, 'slides.pdf'), 415)
+    }
+
+    cold = measure_cold(credentials, events, args.cold_runs)
+    warm = measure_warm(credentials, events, args.warm_runs)
+    regressed = warm['accepted']['p99_ms'] > args.max_warm_p99_ms
+
+    if args.json:
+        print(json.dumps({'warm': warm, 'cold': cold, 'max_warm_p99_ms': args.max_warm_p99_ms, 'regressed': regressed}, indent=2))
+    else:
+        for name in events:
+            print(f"{name}: warm p50 {warm[name]['p50_ms']:.3f} ms p99 {warm[name]['p99_ms']:.3f} ms | "
+                  f"cold init p50 {cold[name]['init']['p50_ms']:.0f} ms, first call p50 {cold[name]['first_call']['p50_ms']:.1f} ms "
+                  f"p99 {cold[name]['first_call']['p99_ms']:.1f} ms")
+        flag = 'REGRESSION' if regressed else 'ok'
+        print(f"accepted warm p99 {warm['accepted']['p99_ms']:.3f} ms (max {args.max_warm_p99_ms:.1f}) [{flag}]")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark for building the per-second transcript from Transcribe items.
+
+Generates synthetic Transcribe `items` for 10-minute, 1-hour and 4-hour
+recordings and reports best-of-N wall time and peak traced memory for the current
+builder and for the original `str +=` implementation, checking that both
+produce identical output.
+
+    python benchmarks/transcript_bench.py
+    python benchmarks/transcript_bench.py --minutes 30 --skip-legacy
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambdas', 'process'))
+
+from transcript import create_transcript_with_seconds  # noqa: E402
+
+WORDS = ["box", "ai", "agent", "model", "the", "developer", "api", "transcript", "video", "and", "with", "prompt"]
+WORDS_PER_SECOND = 2.6
+
+
+def legacy_create_transcript_with_seconds(entries):
+    """The original implementation, kept as the reference output."""
+    transcript = ""
+    second = -1
+
+    for entry in entries:
+
+        if entry['type'] == "punctuation":
+            start = second
+        else:
+            start = int(float(entry['start_time']))
+
+        if second == -1:
+            second = start
+
+        if start == second:
+            transcript += f"{entry['alternatives'][0]['content']} "
+        else:
+            time_tuple = divmod(second, 60)
+            time_string = f"{time_tuple[0]:02d}:{time_tuple[1]:02d}"
+            transcript += f"\n{time_string} {entry['alternatives'][0]['content']} "
+            second = start
+
+    return transcript
+
+
+def synthetic_items(minutes, seed=0):
+    """Transcribe-shaped items: timed pronunciations with periodic punctuation."""
+    rng = random.Random(seed)
+    items = []
+    now = 0.0
+    end = minutes * 60
+
+    while now < end:
+        duration = rng.uniform(0.15, 2 / WORDS_PER_SECOND)
+        items.append({
+            'type': 'pronunciation',
+            'start_time': f"{now:.3f}",
+            'end_time': f"{now + duration:.3f}",
+            'alternatives': [{'confidence': '0.99', 'content': rng.choice(WORDS)}]
+        })
+        if rng.random() < 0.08:
+            items.append({
+                'type': 'punctuation',
+                'alternatives': [{'confidence': '0.0', 'content': rng.choice(".,?")}]
+            })
+        now += duration + rng.uniform(0, 0.1)
+
+    return items
+
+
+def measure(builder, items, repeat):
+    """Best-of-repeat wall time, then peak traced memory from a separate run."""
+    elapsed = min(timeit.repeat(lambda: builder(items), number=1, repeat=repeat))
+
+    tracemalloc.start()
+    output = builder(items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return output, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=int, action='append', help='recording length(s), default 10, 60 and 240')
+    parser.add_argument('--skip-legacy', action='store_true', help='only measure the current builder')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per builder; the fastest is reported')
+    args = parser.parse_args()
+
+    for minutes in args.minutes or [10, 60, 240]:
+        items = synthetic_items(minutes)
+        output, elapsed, peak = measure(create_transcript_with_seconds, items, args.repeat)
+        print(f"{minutes:>4} min, {len(items):>7} items: current {elapsed:7.3f}s peak {peak / 2**20:7.1f} MB", end="")
+
+        if not args.skip_legacy:
+            expected, legacy_elapsed, legacy_peak = measure(legacy_create_transcript_with_seconds, items, args.repeat)
+            if output != expected:
+                print(" OUTPUT MISMATCH")
+                sys.exit(1)
+            print(f" | legacy {legacy_elapsed:7.3f}s peak {legacy_peak / 2**20:7.1f} MB | identical", end="")
+
+        print()
+
+
+if __name__ == '__main__':
+    main()
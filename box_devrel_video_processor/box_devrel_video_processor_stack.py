@@ -6,6 +6,8 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from app_config import app_config
+
 from .constructs.networking import NetworkingConstruct
 from .constructs.storage import StorageConstruct
 from .constructs.security import SecurityConstruct
@@ -33,12 +35,25 @@ class BoxDevRelVideoProcessorStack(cdk.Stack):
                                        api=api)
 
         # Event sources
-        transcribe_source = ales.SqsEventSource(storage.transcribe_queue)
+        # Batches are collected over a short window and their records run
+        # RECORD_WORKERS at a time. The batch size stays at the default 10: a
+        # record can spend minutes moving a multi-GB recording, so a larger
+        # batch would not finish within the 15 minute timeout. Failed records
+        # are returned individually so the rest of the batch is not retried.
+        # max_concurrency bounds the pollers that compete for Transcribe slots.
+        transcribe_source = ales.SqsEventSource(
+            storage.transcribe_queue,
+            batch_size=10,
+            max_batching_window=cdk.Duration.seconds(30),
+            report_batch_item_failures=True,
+            max_concurrency=max(app_config.get('TRANSCRIBE_LAMBDA_MAX_CONCURRENCY', 5), 2)
+        )
         compute.transcribe_lambda.add_event_source(transcribe_source)
 
         summarize_source = ales.S3EventSource(
             storage.transcription_bucket, 
-            events=[s3.EventType.OBJECT_CREATED_PUT],
+            # Copies deliver transcriptions restored from the media cache
+            events=[s3.EventType.OBJECT_CREATED_PUT, s3.EventType.OBJECT_CREATED_COPY],
             filters=[
                 s3.NotificationKeyFilter(
                     prefix="transcriptions/",
@@ -51,11 +66,17 @@ class BoxDevRelVideoProcessorStack(cdk.Stack):
         # Permissions
         storage.job_table.grant_full_access(compute.transcribe_lambda)
         storage.job_table.grant_full_access(compute.summarize_lambda)
+        storage.cache_table.grant_read_write_data(compute.skill_lambda)
+        storage.cache_table.grant_read_write_data(compute.transcribe_lambda)
+        storage.cache_table.grant_read_write_data(compute.summarize_lambda)
+        storage.transcription_bucket.grant_read_write(compute.transcribe_lambda)
         storage.storage_bucket.grant_read_write(compute.transcribe_lambda)
         storage.storage_bucket.grant_read_write(compute.summarize_lambda)
         storage.transcription_bucket.grant_read_write(compute.summarize_lambda)
         storage.transcribe_queue.grant_send_messages(compute.skill_lambda)
         storage.transcribe_queue.grant_consume_messages(compute.transcribe_lambda)
+        # Deferred records are re-sent with a delay while Transcribe is at capacity
+        storage.transcribe_queue.grant_send_messages(compute.transcribe_lambda)
         storage.transcribe_queue.grant_purge(compute.transcribe_lambda)
         
         # Outputs
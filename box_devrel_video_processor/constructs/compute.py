@@ -28,6 +28,14 @@ class ComputeConstruct(Construct):
             layer_version_arn="arn:aws:lambda:us-east-1:770693421928:layer:Klayers-p312-opencv-python:1"
         )
         
+        # Optional static ffmpeg build (at /opt/bin/ffmpeg) for audio-only ingest
+        transcribe_layers = [box_gen_lambda_layer]
+        if app_config.get('FFMPEG_LAYER_ARN'):
+            transcribe_layers.append(_lambda.LayerVersion.from_layer_version_arn(
+                self, "FfmpegLayer",
+                layer_version_arn=app_config['FFMPEG_LAYER_ARN']
+            ))
+
         # Skip ML layers - use container image instead
         
         # Skill Lambda (outside VPC for API Gateway)
@@ -43,7 +51,8 @@ class ComputeConstruct(Construct):
             environment={
                 "LOG_LEVEL": app_config['LOG_LEVEL'],
                 "BOX_SKILL_SECRET_ARN": security.box_skill_secret.secret_arn,
-                "QUEUE_URL": storage.transcribe_queue.queue_url
+                "QUEUE_URL": storage.transcribe_queue.queue_url,
+                "CACHE_TABLE": storage.cache_table.table_name
             }
         )
 
@@ -54,11 +63,12 @@ class ComputeConstruct(Construct):
             index="transcribe.py",
             runtime=_lambda.Runtime.PYTHON_3_12,
             handler="lambda_handler",
-            layers=[box_gen_lambda_layer],
+            layers=transcribe_layers,
             timeout=cdk.Duration.minutes(15),
             role=security.vpc_lambda_role,
             ephemeral_storage_size=Size.gibibytes(10),
-            memory_size=10240,
+            # Media is streamed Box -> S3 in bounded parts, so memory no longer scales with file size
+            memory_size=2048,
             vpc=vpc,
             vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
             environment={
@@ -67,10 +77,33 @@ class ComputeConstruct(Construct):
                 "STORAGE_BUCKET": storage.storage_bucket.bucket_name,
                 "TRANSCRIBE_BUCKET": storage.transcription_bucket.bucket_name,
                 "JOB_TABLE": storage.job_table.table_name,
-                "QUEUE_URL": storage.transcribe_queue.queue_url
+                "QUEUE_URL": storage.transcribe_queue.queue_url,
+                "CACHE_TABLE": storage.cache_table.table_name,
+                "MEDIA_CACHE_RETENTION_DAYS": str(app_config.get('MEDIA_CACHE_RETENTION_DAYS', 30)),
+                "FFMPEG_PATH": "/opt/bin/ffmpeg",
+                "UPLOAD_VIDEO": str(app_config.get('UPLOAD_VIDEO', False)).lower(),
+                "TRANSCRIBE_MAX_CONCURRENT_JOBS": str(app_config.get('TRANSCRIBE_MAX_CONCURRENT_JOBS', 100)),
+                "JOB_RETENTION_DAYS": str(app_config.get('JOB_RETENTION_DAYS', 3))
             }
         )
 
+        summarize_environment = {
+            "LOG_LEVEL": app_config['LOG_LEVEL'],
+            "STORAGE_BUCKET": storage.storage_bucket.bucket_name,
+            "TRANSCRIBE_BUCKET": storage.transcription_bucket.bucket_name,
+            "JOB_TABLE": storage.job_table.table_name,
+            "BOX_DOCGEN_SECRET_ARN": security.box_docgen_secret.secret_arn,
+            "CACHE_TABLE": storage.cache_table.table_name,
+            "MEDIA_CACHE_RETENTION_DAYS": str(app_config.get('MEDIA_CACHE_RETENTION_DAYS', 30)),
+            "BOX_AI_CACHE_BYPASS": str(app_config.get('BOX_AI_CACHE_BYPASS', False)).lower(),
+            "NUMBA_CACHE_DIR": "/tmp",
+            "NUMBA_DISABLE_JIT": "1"
+        }
+
+        # Share CCG access tokens between containers through the job table
+        if app_config.get('SHARE_BOX_TOKENS'):
+            summarize_environment["BOX_TOKEN_TABLE"] = storage.job_table.table_name
+
         # Summarize Lambda (container image for ML dependencies)
         self.summarize_lambda = _lambda.DockerImageFunction(
             self, "SummarizeLambda",
@@ -85,13 +118,5 @@ class ComputeConstruct(Construct):
             memory_size=10240,
             vpc=vpc,
             vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
-            environment={
-                "LOG_LEVEL": app_config['LOG_LEVEL'],
-                "STORAGE_BUCKET": storage.storage_bucket.bucket_name,
-                "TRANSCRIBE_BUCKET": storage.transcription_bucket.bucket_name,
-                "JOB_TABLE": storage.job_table.table_name,
-                "BOX_DOCGEN_SECRET_ARN": security.box_docgen_secret.secret_arn,
-                "NUMBA_CACHE_DIR": "/tmp",
-                "NUMBA_DISABLE_JIT": "1"
-            }
+            environment=summarize_environment
         )
\ No newline at end of file
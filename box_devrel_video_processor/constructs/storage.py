@@ -6,6 +6,7 @@ from aws_cdk import (
     aws_cloudtrail as cloudtrail
 )
 from constructs import Construct
+from app_config import app_config
 
 class StorageConstruct(Construct):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -21,7 +22,9 @@ class StorageConstruct(Construct):
         self.transcribe_queue = sqs.Queue(
             self, "TranscribeQueue",
             queue_name="DevRelTranscribeQueue",
-            visibility_timeout=cdk.Duration.minutes(15),
+            # Covers the transcribe Lambda timeout plus the batching window, so
+            # messages do not reappear while their batch is still running
+            visibility_timeout=cdk.Duration.minutes(20),
             removal_policy=cdk.RemovalPolicy.DESTROY,
             dead_letter_queue=sqs.DeadLetterQueue(
                 max_receive_count=3,
@@ -52,7 +55,16 @@ class StorageConstruct(Construct):
             encryption=s3.BucketEncryption.S3_MANAGED,
             versioned=True,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
-            enforce_ssl=True
+            enforce_ssl=True,
+            lifecycle_rules=[
+                # Recordings and audio are normally deleted by the summarize Lambda;
+                # this removes those left behind by jobs that failed for good
+                s3.LifecycleRule(
+                    expiration=cdk.Duration.days(app_config.get('JOB_RETENTION_DAYS', 3)),
+                    noncurrent_version_expiration=cdk.Duration.days(1),
+                    abort_incomplete_multipart_upload_after=cdk.Duration.days(1)
+                )
+            ]
         )
 
         self.transcription_bucket = s3.Bucket(
@@ -64,13 +76,40 @@ class StorageConstruct(Construct):
             encryption=s3.BucketEncryption.S3_MANAGED,
             versioned=True,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
-            enforce_ssl=True
+            enforce_ssl=True,
+            lifecycle_rules=[
+                # Expire deduplicated transcription artifacts with their cache entries
+                s3.LifecycleRule(
+                    prefix="cache/",
+                    expiration=cdk.Duration.days(app_config.get('MEDIA_CACHE_RETENTION_DAYS', 30)),
+                    noncurrent_version_expiration=cdk.Duration.days(1)
+                ),
+                # Transcriptions of jobs that failed for good
+                s3.LifecycleRule(
+                    prefix="transcriptions/",
+                    expiration=cdk.Duration.days(app_config.get('JOB_RETENTION_DAYS', 3)),
+                    noncurrent_version_expiration=cdk.Duration.days(1)
+                )
+            ]
         )
         
         self.job_table = _dynamo.Table(
             self, "JobTable",
             table_name="devRelTranscriptionJobTable",
             partition_key=_dynamo.Attribute(name="job_id", type=_dynamo.AttributeType.STRING),
+            # Removes job records (and their stage checkpoints) left by jobs that
+            # exhausted their retries; shared token items expire with their token
+            time_to_live_attribute="expires_at",
+            removal_policy=cdk.RemovalPolicy.DESTROY,
+            encryption=_dynamo.TableEncryption.AWS_MANAGED
+        )
+
+        # Content-hash and response caches; entries expire through TTL
+        self.cache_table = _dynamo.Table(
+            self, "CacheTable",
+            table_name="devRelCacheTable",
+            partition_key=_dynamo.Attribute(name="cache_key", type=_dynamo.AttributeType.STRING),
+            time_to_live_attribute="expires_at",
             removal_policy=cdk.RemovalPolicy.DESTROY,
             encryption=_dynamo.TableEncryption.AWS_MANAGED
         )
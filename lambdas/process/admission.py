@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+import cache_util
+
+logger = logging.getLogger(__name__)
+
+JOB_TABLE = os.environ['JOB_TABLE']
+# Concurrent Transcribe jobs this deployment may run; keep at or below the account quota
+MAX_CONCURRENT_JOBS = int(os.environ.get('TRANSCRIBE_MAX_CONCURRENT_JOBS', '100'))
+# The counter is corrected from Transcribe at most this often per container
+RECONCILE_INTERVAL_SECONDS = 60
+
+# Counter item, stored alongside the jobs in JOB_TABLE
+COUNTER_KEY = {'job_id': 'transcribe#in-flight'}
+
+_table = None
+_reconcile_lock = threading.Lock()
+_last_reconcile = 0.0
+
+
+class CapacityFull(Exception):
+    """Raised when no Transcribe job slot is free; the work should be retried later."""
+
+
+def get_table():
+    global _table
+    if _table is None:
+        _table = boto3.resource('dynamodb').Table(JOB_TABLE)
+    return _table
+
+
+def _try_acquire(limit):
+    try:
+        get_table().update_item(
+            Key=COUNTER_KEY,
+            UpdateExpression="ADD in_flight :one",
+            ConditionExpression="attribute_not_exists(in_flight) OR in_flight < :limit",
+            ExpressionAttributeValues={':one': 1, ':limit': limit}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def reconcile():
+    """
+    Resets the counter to the number of jobs Transcribe reports as queued or
+    in progress, correcting slots that were never released (for example
+    jobs that failed and so never reached the summarize Lambda). Slots are
+    only taken as a job starts, so started jobs are all the counter holds.
+    """
+    global _last_reconcile
+
+    with _reconcile_lock:
+        if time.monotonic() - _last_reconcile < RECONCILE_INTERVAL_SECONDS:
+            return None
+        _last_reconcile = time.monotonic()
+
+    paginator = cache_util.get_client('transcribe').get_paginator('list_transcription_jobs')
+    running = sum(
+        len(page['TranscriptionJobSummaries'])
+        for status in ('QUEUED', 'IN_PROGRESS')
+        for page in paginator.paginate(Status=status)
+    )
+
+    get_table().update_item(
+        Key=COUNTER_KEY,
+        UpdateExpression="SET in_flight = :running",
+        ExpressionAttributeValues={':running': running}
+    )
+    logger.info(f"Reconciled Transcribe in-flight counter to {running}")
+
+    return running
+
+
+def check_capacity(limit=MAX_CONCURRENT_JOBS):
+    """
+    Raises CapacityFull when every slot is taken, without taking one, so
+    work can be deferred before any media is moved.
+    """
+    item = get_table().get_item(Key=COUNTER_KEY, ConsistentRead=True).get('Item') or {}
+    if int(item.get('in_flight', 0)) < limit:
+        return
+
+    running = reconcile()
+    if running is not None and running < limit:
+        return
+
+    raise CapacityFull(f"{limit} Transcribe jobs already in flight")
+
+
+def acquire(limit=MAX_CONCURRENT_JOBS):
+    """Takes a job slot, or raises CapacityFull when all limit slots are held."""
+    if _try_acquire(limit):
+        return
+
+    if reconcile() is not None and _try_acquire(limit):
+        return
+
+    raise CapacityFull(f"{limit} Transcribe jobs already in flight")
+
+
+def release():
+    """Returns a job slot."""
+    try:
+        get_table().update_item(
+            Key=COUNTER_KEY,
+            UpdateExpression="ADD in_flight :minus_one",
+            ConditionExpression="in_flight > :zero",
+            ExpressionAttributeValues={':minus_one': -1, ':zero': 0}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        logger.warning("Transcribe in-flight counter already at zero")
+
+
+def release_job(job_id):
+    """
+    Returns the slot held by a job once its transcription is complete. The
+    job record is marked first, so repeated deliveries release it only once.
+    """
+    try:
+        get_table().update_item(
+            Key={'job_id': job_id},
+            UpdateExpression="SET slot_released = :released",
+            ConditionExpression="attribute_exists(holds_slot) AND attribute_not_exists(slot_released)",
+            ExpressionAttributeValues={':released': True}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+    release()
+    return True
@@ -1,20 +1,66 @@
 import boto3
+from botocore.exceptions import ClientError
 import json
 import os
+import time
 import uuid
 
+import cache_util
+import media_util
+from transcript import stream_transcribe_output
+
+VIDEO_CHUNK_SIZE = 8 * 1024 * 1024
+TRANSCRIPTION_CHUNK_SIZE = 1024 * 1024
+
 class ai_util:
 
     def __init__(self):
-        self.transcribe = boto3.client("transcribe")
-        self.bedrock = boto3.client("bedrock-runtime")
-        self.s3 = boto3.client("s3")
+        self.transcribe = cache_util.get_client("transcribe")
+        self.bedrock = cache_util.get_client("bedrock-runtime")
+        self.s3 = cache_util.get_client("s3")
         self.transcriptions_store = os.environ['TRANSCRIBE_BUCKET']
         self.recordings_store = os.environ['STORAGE_BUCKET']
         
     def get_transcription_status(self, job_name):
         return self.transcribe.get_transcription_job(TranscriptionJobName=job_name)
     
+    def object_exists(self, bucket, key):
+        try:
+            self.s3.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def wait_for_transcription(self, job_unique_name, deadline, initial_delay=0.25, max_delay=4):
+        """
+        Waits until both the .json and .srt outputs of a Transcribe job exist.
+
+        S3 objects only become visible once fully written, so presence means
+        the artifact is complete. Polls with exponential backoff until deadline
+        (a time.time() value) and returns False if the outputs never appear.
+        """
+        missing = [f"transcriptions/{job_unique_name}.json", f"transcriptions/{job_unique_name}.srt"]
+        delay = initial_delay
+
+        while True:
+            missing = [key for key in missing if not self.object_exists(self.transcriptions_store, key)]
+            if not missing:
+                return True
+
+            if time.time() + delay > deadline:
+                try:
+                    status = self.get_transcription_status(job_unique_name)['TranscriptionJob']['TranscriptionJobStatus']
+                except ClientError:
+                    # Jobs restored from the media cache have no Transcribe job
+                    status = "unknown"
+                print(f"Transcription {job_unique_name} not ready, status {status}, missing {missing}")
+                return False
+
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
     def get_transcription(self, job_unique_name):
         response = self.s3.get_object(
             Bucket=self.transcriptions_store,
@@ -29,6 +75,18 @@ class ai_util:
 
         return transcript, items
     
+    def stream_transcription(self, job_unique_name, chunk_size=TRANSCRIPTION_CHUNK_SIZE):
+        """
+        Like get_transcription, but streams the S3 body and returns the items
+        as an iterator that decodes them one at a time.
+        """
+        response = self.s3.get_object(
+            Bucket=self.transcriptions_store,
+            Key=f"transcriptions/{job_unique_name}.json"
+        )
+
+        return stream_transcribe_output(response['Body'].iter_chunks(chunk_size))
+    
     def get_subtitles(self, job_unique_name):
         print(f"getting subtitles for {job_unique_name}")
         response = self.s3.get_object(
@@ -49,6 +107,40 @@ class ai_util:
         
         return content
     
+    def download_video(self, file_key, dest_path, window_seconds=None, chunk_size=VIDEO_CHUNK_SIZE):
+        """
+        Streams a recording to dest_path in fixed-size chunks.
+
+        With window_seconds set, MP4/MOV recordings are fetched range-limited:
+        only the container index and the bytes covering the opening window are
+        transferred. Other containers fall back to a full streamed download.
+        """
+        bucket = self.recordings_store
+
+        if window_seconds is not None:
+            size = self.s3.head_object(Bucket=bucket, Key=f"{file_key}")['ContentLength']
+
+            def fetch_range(start, end):
+                response = self.s3.get_object(
+                    Bucket=bucket,
+                    Key=f"{file_key}",
+                    Range=f"bytes={start}-{end - 1}"
+                )
+                return response['Body'].iter_chunks(chunk_size)
+
+            if media_util.write_sampling_window(fetch_range, size, dest_path, window_seconds):
+                return dest_path
+
+        response = self.s3.get_object(
+            Bucket=bucket,
+            Key=f"{file_key}"
+        )
+        with open(dest_path, "wb") as f:
+            for chunk in response['Body'].iter_chunks(chunk_size):
+                f.write(chunk)
+
+        return dest_path
+
     def delete_files(self, *file_keys):
         for file_key in file_keys:
             try:
@@ -1,8 +1,14 @@
+import base64
+import hashlib
 import io
 import os
 import datetime
 import json
-import tempfile
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 import boto3
 
@@ -30,7 +36,206 @@ from box_sdk_gen import (
     CreateFolderParent
 )
 
+from box_sdk_gen.box.token_storage import TokenStorage
 from box_sdk_gen.internal.utils import ByteStream
+from box_sdk_gen.networking.network import NetworkSession
+from box_sdk_gen.networking.retries import BoxRetryStrategy
+from box_sdk_gen.schemas.access_token import AccessToken
+
+import media_util
+
+AI_MAX_CONCURRENCY = int(os.environ.get('BOX_AI_MAX_CONCURRENCY', '5'))
+# Retries of throttled (429) and failed (5xx) Box calls are left to the SDK's
+# retry strategy, capped so a long Retry-After cannot stall a job
+BOX_MAX_ATTEMPTS = int(os.environ.get('BOX_MAX_ATTEMPTS', '5'))
+BOX_MAX_RETRY_AFTER_SECONDS = 30
+
+# Box only accepts upload sessions for files of 20 MB or more
+CHUNKED_UPLOAD_THRESHOLD = max(int(os.environ.get('CHUNKED_UPLOAD_THRESHOLD_MB', '20')), 20) * 1024 * 1024
+CHUNKED_UPLOAD_WORKERS = int(os.environ.get('CHUNKED_UPLOAD_WORKERS', '4'))
+
+VIDEO_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Recent DocGen completion times in this container, used to time the first poll
+DOCGEN_COMPLETION_HISTORY = deque(maxlen=20)
+DOCGEN_DEFAULT_INITIAL_DELAY = 2.0
+DOCGEN_POLL_INTERVAL = 1.0
+DOCGEN_MAX_POLL_INTERVAL = 10.0
+DOCGEN_BACKOFF_FACTOR = 1.5
+
+class CappedRetryStrategy(BoxRetryStrategy):
+    """The SDK's retry strategy (Retry-After, exponential backoff with jitter) with a ceiling on each wait."""
+
+    def retry_after(self, fetch_options, fetch_response, attempt_number):
+        return min(super().retry_after(fetch_options, fetch_response, attempt_number), BOX_MAX_RETRY_AFTER_SECONDS)
+
+# Tokens are treated as expired this long before Box would reject them
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+# Optional DynamoDB table (keyed on job_id) used to share tokens across containers
+BOX_TOKEN_TABLE = os.environ.get('BOX_TOKEN_TABLE')
+
+class SharedTokenStorage(TokenStorage):
+    """
+    CCG token store keyed by (client_id, user_id), shared by every client in
+    the process and optionally persisted in BOX_TOKEN_TABLE so other
+    containers can reuse it. A token is reported missing shortly before it
+    expires, which makes the SDK refresh ahead of expiry.
+    """
+
+    _tokens = {}
+    _locks = {}
+    _registry_lock = threading.Lock()
+    _table = None
+
+    def __init__(self, client_id, user_id):
+        self.client_id = client_id
+        self.user_id = user_id
+        self.key = (client_id, user_id)
+
+        with SharedTokenStorage._registry_lock:
+            self.refresh_lock = SharedTokenStorage._locks.setdefault(self.key, threading.Lock())
+            if BOX_TOKEN_TABLE and SharedTokenStorage._table is None:
+                SharedTokenStorage._table = boto3.resource('dynamodb').Table(BOX_TOKEN_TABLE)
+
+    @property
+    def _item_key(self):
+        return {'job_id': f"box-token#{self.client_id}#{self.user_id}"}
+
+    def store(self, token):
+        expires_at = int(time.time()) + int(token.expires_in or 0)
+        SharedTokenStorage._tokens[self.key] = (token, expires_at)
+
+        if SharedTokenStorage._table is not None:
+            SharedTokenStorage._table.put_item(Item={
+                **self._item_key,
+                'access_token': token.access_token,
+                'token_type': token.token_type or 'bearer',
+                'expires_at': expires_at
+            })
+
+    def get(self):
+        entry = SharedTokenStorage._tokens.get(self.key)
+
+        if entry is None and SharedTokenStorage._table is not None:
+            item = SharedTokenStorage._table.get_item(Key=self._item_key).get('Item')
+            if item:
+                expires_at = int(item['expires_at'])
+                token = AccessToken(
+                    access_token=item['access_token'],
+                    token_type=item['token_type'],
+                    expires_in=max(expires_at - int(time.time()), 0)
+                )
+                entry = SharedTokenStorage._tokens[self.key] = (token, expires_at)
+
+        if entry is None or entry[1] - time.time() < TOKEN_REFRESH_MARGIN_SECONDS:
+            return None
+
+        return entry[0]
+
+    def clear(self):
+        SharedTokenStorage._tokens.pop(self.key, None)
+
+        if SharedTokenStorage._table is not None:
+            SharedTokenStorage._table.delete_item(Key=self._item_key)
+
+class CoalescingCCGAuth(BoxCCGAuth):
+    """BoxCCGAuth that lets only one thread per (client_id, user_id) fetch a new token at a time."""
+
+    def retrieve_token(self, *args, **kwargs):
+        with self.token_storage.refresh_lock:
+            return super().retrieve_token(*args, **kwargs)
+
+# Box AI answers are cached in the container and, when CACHE_TABLE is set, in
+# DynamoDB so retries and reprocessed transcripts skip the generation calls
+AI_CACHE_TABLE = os.environ.get('CACHE_TABLE')
+AI_CACHE_SIZE = int(os.environ.get('BOX_AI_CACHE_SIZE', '256'))
+AI_CACHE_TTL_SECONDS = int(os.environ.get('BOX_AI_CACHE_TTL_HOURS', '168')) * 3600
+AI_CACHE_BYPASS = os.environ.get('BOX_AI_CACHE_BYPASS', 'false').lower() in ('1', 'true', 'yes')
+
+class AiResponseCache:
+    """
+    Two-tier cache of Box AI answers: an LRU of AI_CACHE_SIZE entries in the
+    container, backed by TTL'd items in AI_CACHE_TABLE. Values are stored as
+    JSON so extract answers and plain-text answers share one format.
+    """
+
+    def __init__(self, max_entries=AI_CACHE_SIZE, ttl_seconds=AI_CACHE_TTL_SECONDS, table_name=AI_CACHE_TABLE):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.table_name = table_name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._table = None
+
+    @staticmethod
+    def make_key(kind, agent_id, prompt, content):
+        content_digest = hashlib.sha256(content.encode()).hexdigest()
+        key = json.dumps([kind, agent_id, prompt, content_digest])
+        return "ai#" + hashlib.sha256(key.encode()).hexdigest()
+
+    def get_table(self):
+        if self._table is None and self.table_name:
+            self._table = boto3.resource('dynamodb').Table(self.table_name)
+        return self._table
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+
+        table = self.get_table()
+        if table is None:
+            return None
+
+        item = table.get_item(Key={'cache_key': key}).get('Item')
+        # DynamoDB TTL deletes lazily, so expired items can still be read
+        if not item or int(item['expires_at']) <= time.time():
+            return None
+
+        value = json.loads(item['response'])
+        self._remember(key, value, int(item['expires_at']))
+        return value
+
+    def put(self, key, value):
+        expires_at = int(time.time()) + self.ttl_seconds
+        self._remember(key, value, expires_at)
+
+        table = self.get_table()
+        if table is not None:
+            table.put_item(Item={
+                'cache_key': key,
+                'response': json.dumps(value),
+                'expires_at': expires_at
+            })
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+ai_response_cache = AiResponseCache()
+
+def sha1_digest(data):
+    """Digest header value Box expects for chunked upload parts and commits."""
+    return "sha=" + base64.b64encode(hashlib.sha1(data).digest()).decode()
+
+def is_auth_error(error):
+    """True if a Box call failed because the client credentials or token were rejected."""
+    response_info = getattr(error, 'response_info', None)
+    if getattr(response_info, 'status_code', None) == 401:
+        return True
+    message = str(error)
+    return 'invalid_client' in message or 'invalid_grant' in message
 
 class box_util:
 
@@ -59,32 +264,37 @@ class box_util:
             client_id=self.client_id,
             client_secret=self.client_secret,
             user_id=user_id,
+            token_storage=SharedTokenStorage(self.client_id, user_id),
         )
-        auth = BoxCCGAuth(config=ccg_config)
-        return BoxClient(auth=auth)
+        auth = CoalescingCCGAuth(config=ccg_config)
+        network_session = NetworkSession(retry_strategy=CappedRetryStrategy(max_attempts=BOX_MAX_ATTEMPTS))
+        return BoxClient(auth=auth, network_session=network_session)
     
     def upload_file(self, file_name, content, folder_id):
-        is_bytes = isinstance(content, (bytes, bytearray))
-        mode = "wb" if is_bytes else "w"
-        with tempfile.NamedTemporaryFile(mode=mode, delete=False) as temp_file:
-            # Write bytes or text
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        """
+        Uploads bytes or text straight from memory. Payloads of at least
+        CHUNKED_UPLOAD_THRESHOLD bytes go through a chunked upload session
+        with parts sent in parallel.
+        """
+        data = content.encode('utf-8') if isinstance(content, str) else content
+
+        # Use root folder if folder_id is not provided
+        parent_id = "0"
+        if folder_id is not None:
+            parent_id = str(folder_id)
 
         try:
-            # Upload the file
-            with open(temp_file_path, "rb") as file:
-                # Use root folder if folder_id is not provided
-                parent_id = "0"
-                if folder_id is not None:
-                    parent_id = str(folder_id)
-
-                uploaded_file = self.client.uploads.upload_file(
-                    UploadFileAttributes(
-                        name=file_name, parent=UploadFileAttributesParentField(id=parent_id)
-                    ),
-                    file,
-                )
+            view = memoryview(data)
+
+            if view.nbytes >= CHUNKED_UPLOAD_THRESHOLD:
+                return self._upload_chunked(file_name, view, parent_id)
+
+            uploaded_file = self.client.uploads.upload_file(
+                UploadFileAttributes(
+                    name=file_name, parent=UploadFileAttributesParentField(id=parent_id)
+                ),
+                io.BytesIO(view),
+            )
 
             self.logger.debug(f"File uploaded successfully: {uploaded_file.to_dict()}")
             
@@ -96,11 +306,118 @@ class box_util:
             return {
                 'statusCode' : 500
             }
-        finally:
-            # Clean up the temporary file
-            os.unlink(temp_file_path)
 
-    def box_ai_extract(self, content, ai_file_id, metadata_template_key):
+    def _upload_chunked(self, file_name, view, parent_id):
+        upload_session = self.client.chunked_uploads.create_file_upload_session(parent_id, view.nbytes, file_name)
+        part_size = upload_session.part_size
+
+        def upload_part(offset):
+            # Slicing the memoryview does not copy; only the part being sent is buffered
+            chunk = view[offset:offset + part_size]
+            return self.client.chunked_uploads.upload_file_part(
+                upload_session.id,
+                io.BytesIO(chunk),
+                sha1_digest(chunk),
+                f"bytes {offset}-{offset + chunk.nbytes - 1}/{view.nbytes}"
+            ).part
+
+        with ThreadPoolExecutor(max_workers=CHUNKED_UPLOAD_WORKERS) as executor:
+            parts = list(executor.map(upload_part, range(0, view.nbytes, part_size)))
+
+        uploaded_file = self.client.chunked_uploads.create_file_upload_session_commit(
+            upload_session.id, parts, sha1_digest(view)
+        )
+        if uploaded_file is None:
+            raise Exception(f"Upload session {upload_session.id} was not committed")
+
+        self.logger.debug(f"File uploaded in {len(parts)} parts: {uploaded_file.to_dict()}")
+
+        return uploaded_file.to_dict()['entries'][0]
+
+    def download_video(self, file_id, dest_path, window_seconds=None, chunk_size=VIDEO_CHUNK_SIZE):
+        """
+        Box counterpart of ai_util.download_video, for recordings that are not
+        in the storage bucket. Streams to dest_path, range-limited to the
+        opening window_seconds where the container allows it.
+        """
+
+        def read_chunks(stream):
+            return iter(lambda: stream.read(chunk_size), b"")
+
+        if window_seconds is not None:
+            size = self.client.files.get_file_by_id(file_id, fields=['size']).size
+
+            def fetch_range(start, end):
+                return read_chunks(self.client.downloads.download_file(file_id, range=f"bytes={start}-{end - 1}"))
+
+            if media_util.write_sampling_window(fetch_range, size, dest_path, window_seconds):
+                return dest_path
+
+        with open(dest_path, "wb") as f:
+            for chunk in read_chunks(self.client.downloads.download_file(file_id)):
+                f.write(chunk)
+
+        return dest_path
+
+    def run_ai_requests(self, requests, max_concurrency=AI_MAX_CONCURRENCY):
+        """
+        Runs independent Box AI calls concurrently.
+
+        requests maps a result name to a zero-argument callable, typically a
+        functools.partial of ask_box_ai or box_ai_extract. Failed calls yield
+        None, exactly as when they are called directly.
+        """
+        if not requests:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(requests))) as executor:
+            futures = {name: executor.submit(request) for name, request in requests.items()}
+
+        return {name: future.result() for name, future in futures.items()}
+
+    def _cached_ai_call(self, cache_key, use_cache, call):
+        """
+        Returns a cached Box AI answer, or makes the call and caches a
+        non-None answer. With use_cache=False or BOX_AI_CACHE_BYPASS set the
+        cached answer is ignored but the fresh one still replaces it.
+        Cache failures never fail the call.
+        """
+        if use_cache and not AI_CACHE_BYPASS:
+            try:
+                cached = ai_response_cache.get(cache_key)
+            except Exception as e:
+                self.logger.warning(f"Box AI cache read failed: {e}")
+                cached = None
+
+            if cached is not None:
+                self.logger.info(f"Box AI cache hit for {cache_key}")
+                return cached
+
+        answer = call()
+
+        if answer is not None:
+            try:
+                ai_response_cache.put(cache_key, answer)
+            except Exception as e:
+                self.logger.warning(f"Box AI cache write failed: {e}")
+
+        return answer
+
+    def box_ai_extract(self, content, ai_file_id, metadata_template_key, use_cache=True):
+        cache_key = AiResponseCache.make_key("extract", "enhanced_extract_agent", metadata_template_key, content)
+        return self._cached_ai_call(
+            cache_key, use_cache,
+            lambda: self._box_ai_extract(content, ai_file_id, metadata_template_key)
+        )
+
+    def ask_box_ai(self, content, prompt, agent_id, ai_file_id, use_cache=True):
+        cache_key = AiResponseCache.make_key("ask", agent_id, prompt, content)
+        return self._cached_ai_call(
+            cache_key, use_cache,
+            lambda: self._ask_box_ai(content, prompt, agent_id, ai_file_id)
+        )
+
+    def _box_ai_extract(self, content, ai_file_id, metadata_template_key):
         
         ai_ask_agent_config = AiAgentReference(id="enhanced_extract_agent", type=AiAgentReferenceTypeField.AI_AGENT_ID)
         try:
@@ -126,9 +443,10 @@ class box_util:
             self.logger.error(f"Error asking box ai: {e}")
             return None
         
-    def ask_box_ai(self, content, prompt, agent_id, ai_file_id):
+    def _ask_box_ai(self, content, prompt, agent_id, ai_file_id):
         
-        ai_ask_agent_config = AiAgentReference(id=agent_id, type=AiAgentReferenceTypeField.AI_AGENT_ID)
+        # Without an agent id Box AI uses its default agent
+        ai_ask_agent_config = AiAgentReference(id=agent_id, type=AiAgentReferenceTypeField.AI_AGENT_ID) if agent_id else None
         try:
             box_ai_response = self.client.ai.create_ai_ask(
                 CreateAiAskMode.SINGLE_ITEM_QA,
@@ -149,7 +467,14 @@ class box_util:
             self.logger.error(f"Error asking box ai: {e}")
             return None
 
-    def generate_document(self, doc_contents, folder_id, file_name, template_id):
+    def generate_document(self, doc_contents, folder_id, file_name, template_id, deadline=None, wait=True):
+        """
+        Starts a DocGen batch and waits for its output file id.
+
+        deadline is a time.time() value after which polling stops and None is
+        returned. With wait=False the batch id is returned immediately so the
+        result can be collected later with check_document or wait_for_document.
+        """
         docgen_jobs = self.client.docgen.create_docgen_batch_v2025_r0(
         FileReferenceV2025R0(id=template_id), # type: ignore
         "api",
@@ -164,22 +489,57 @@ class box_util:
 
         self.logger.debug(f"Docgen job created with id: {docgen_jobs.id}")
 
-        # Wait for the docgen job to complete
+        if not wait:
+            return docgen_jobs.id
+
+        return self.wait_for_document(docgen_jobs.id, deadline)
+
+    def check_document(self, batch_id):
+        """Returns (status, output file id) for a DocGen batch; the id is None until it completes."""
+        docgen_batch = self.client.docgen.get_docgen_batch_job_by_id_v2025_r0(batch_id)
+        entry = docgen_batch.entries[0]
+
+        self.logger.debug(f"Docgen job status: {entry.status}")
+        if entry.status == DocGenJobV2025R0StatusField.COMPLETED:
+            return entry.status, entry.output_file.id
+        if entry.status == DocGenJobV2025R0StatusField.FAILED:
+            self.logger.error(f"Docgen job failed: {docgen_batch}")
+
+        return entry.status, None
+
+    def wait_for_document(self, batch_id, deadline=None):
+        """
+        Polls a DocGen batch until it completes, fails or the deadline passes.
+
+        The first poll is delayed to just under the typical completion time seen
+        in this container, then the interval backs off exponentially up to a cap.
+        """
+        started = time.monotonic()
+
+        if DOCGEN_COMPLETION_HISTORY:
+            delay = statistics.median(DOCGEN_COMPLETION_HISTORY) * 0.8
+        else:
+            delay = DOCGEN_DEFAULT_INITIAL_DELAY
+        interval = DOCGEN_POLL_INTERVAL
+
         while True:
-            docgen_batch = self.client.docgen.get_docgen_batch_job_by_id_v2025_r0(docgen_jobs.id)
-
-            self.logger.debug(f"Docgen job status: {docgen_batch.entries[0].status}")
-            if docgen_batch.entries[0].status == DocGenJobV2025R0StatusField.COMPLETED:
-                self.logger.debug(f"Docgen job completed with status: {docgen_batch.entries[0].status}")
-                self.logger.info(f"Docgen job output file id: {docgen_batch.entries[0].output_file.id}")
-                return docgen_batch.entries[0].output_file.id
-            if docgen_batch.entries[0].status == DocGenJobV2025R0StatusField.FAILED:
-                self.logger.error(f"Docgen job failed: {docgen_batch}")
+            if deadline is not None and time.time() + delay > deadline:
+                self.logger.error(f"Docgen job {batch_id} did not complete before the deadline")
                 return None
 
-            sleep(1)
-        
-        return None
+            sleep(delay)
+
+            status, output_file_id = self.check_document(batch_id)
+
+            if status == DocGenJobV2025R0StatusField.COMPLETED:
+                DOCGEN_COMPLETION_HISTORY.append(time.monotonic() - started)
+                self.logger.info(f"Docgen job output file id: {output_file_id}")
+                return output_file_id
+            if status == DocGenJobV2025R0StatusField.FAILED:
+                return None
+
+            delay = interval
+            interval = min(interval * DOCGEN_BACKOFF_FACTOR, DOCGEN_MAX_POLL_INTERVAL)
     
     def create_docgen_json(self, 
         topic,
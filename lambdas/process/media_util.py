@@ -0,0 +1,272 @@
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Header reads allowed while looking for moov and mdat; each is a ranged GET
+MAX_BOX_PROBES = 32
+
+
+def read_range(fetch_range, start, end):
+    """Reads [start, end) through fetch_range into a single bytes object."""
+    return b"".join(fetch_range(start, end))
+
+
+def read_mp4_boxes(fetch_range, size, max_probes=MAX_BOX_PROBES):
+    """
+    Walks the top-level boxes of an ISO-BMFF (MP4/MOV) file using small
+    ranged reads of each box header. The walk stops once both moov and mdat
+    have been seen, at the first moof (a fragmented file, which has no
+    complete sample tables to window with), or after max_probes reads.
+
+    Args:
+        fetch_range: Callable (start, end) returning an iterable of byte chunks for [start, end).
+        size (int): Total size of the object in bytes.
+        max_probes (int): Most box headers to read.
+    Returns:
+        list: (box_type, offset, box_size) tuples, or an empty list if the data is not ISO-BMFF.
+    """
+    boxes = []
+    offset = 0
+
+    while offset + 8 <= size and len(boxes) < max_probes:
+        header = read_range(fetch_range, offset, min(offset + 16, size))
+        box_size, box_type = struct.unpack(">I4s", header[:8])
+
+        if box_size == 1 and len(header) >= 16:
+            box_size = struct.unpack(">Q", header[8:16])[0]
+        elif box_size == 0:
+            box_size = size - offset
+
+        if box_size < 8 or not box_type.isalnum():
+            # Not a box header; either not ISO-BMFF or trailing garbage
+            return boxes
+
+        box_type = box_type.decode("latin-1")
+        boxes.append((box_type, offset, box_size))
+        offset += box_size
+
+        seen = {seen_type for seen_type, _, _ in boxes}
+        if box_type == "moof" or {"moov", "mdat"} <= seen:
+            break
+
+    return boxes
+
+
+def parse_movie_duration(moov):
+    """Returns the movie duration in seconds from a moov box payload, or None."""
+    index = moov.find(b"mvhd")
+    if index < 0:
+        return None
+
+    body = moov[index + 4:]
+    version = body[0]
+
+    if version == 1:
+        timescale, duration = struct.unpack(">IQ", body[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", body[12:20])
+
+    if not timescale:
+        return None
+
+    return duration / timescale
+
+
+def iter_child_boxes(data, start=0, end=None):
+    """
+    Yields (box_type, body_start, body_end) for the boxes laid out back to
+    back in data[start:end], stopping at the first malformed header.
+    """
+    end = len(data) if end is None else end
+    offset = start
+
+    while offset + 8 <= end:
+        box_size, box_type = struct.unpack(">I4s", data[offset:offset + 8])
+        header_size = 8
+
+        if box_size == 1 and offset + 16 <= end:
+            box_size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - offset
+
+        if box_size < header_size or offset + box_size > end:
+            return
+
+        yield box_type.decode("latin-1"), offset + header_size, offset + box_size
+        offset += box_size
+
+
+def find_child_box(data, box_type, start=0, end=None):
+    """Returns (body_start, body_end) of the first box_type child in data[start:end], or None."""
+    for child_type, body_start, body_end in iter_child_boxes(data, start, end):
+        if child_type == box_type:
+            return body_start, body_end
+    return None
+
+
+def _read_table(data, body_start, entry_format):
+    # Sample table full boxes: version/flags, entry_count, then the entries
+    count = struct.unpack(">I", data[body_start + 4:body_start + 8])[0]
+    entry_size = struct.calcsize(entry_format)
+    first = body_start + 8
+    return [struct.unpack(entry_format, data[first + i * entry_size:first + (i + 1) * entry_size]) for i in range(count)]
+
+
+def track_window_end(moov, trak_start, trak_end, window_seconds):
+    """
+    Returns the file offset just past the last media byte a decoder needs
+    for the opening window_seconds of one track, computed from its sample
+    tables, or None if the tables cannot be read.
+
+    Samples are taken in decode order, and a frame is never decoded after
+    it is shown, so every frame shown in the window is covered.
+    """
+    mdia = find_child_box(moov, "mdia", trak_start, trak_end)
+    if not mdia:
+        return None
+
+    mdhd = find_child_box(moov, "mdhd", *mdia)
+    minf = find_child_box(moov, "minf", *mdia)
+    stbl = minf and find_child_box(moov, "stbl", *minf)
+    if not mdhd or not stbl:
+        return None
+
+    mdhd_start = mdhd[0]
+    if moov[mdhd_start] == 1:
+        timescale = struct.unpack(">I", moov[mdhd_start + 20:mdhd_start + 24])[0]
+    else:
+        timescale = struct.unpack(">I", moov[mdhd_start + 12:mdhd_start + 16])[0]
+
+    tables = {box_type: body_start for box_type, body_start, _ in iter_child_boxes(moov, *stbl)}
+    if not timescale or not {"stts", "stsc", "stsz"} <= tables.keys() or not {"stco", "co64"} & tables.keys():
+        return None
+
+    # Number of samples decoded before the end of the window
+    window_end = window_seconds * timescale
+    needed = 0
+    decode_time = 0
+    for sample_count, sample_delta in _read_table(moov, tables["stts"], ">II"):
+        if not sample_delta:
+            needed += sample_count if decode_time < window_end else 0
+            continue
+        in_window = min(sample_count, max(0, -(-(window_end - decode_time) // sample_delta)))
+        needed += int(in_window)
+        decode_time += sample_count * sample_delta
+        if in_window < sample_count:
+            break
+
+    if not needed:
+        return None
+
+    stsz = tables["stsz"]
+    fixed_size, sample_count = struct.unpack(">II", moov[stsz + 4:stsz + 12])
+    needed = min(needed, sample_count)
+    if fixed_size:
+        sizes = [fixed_size] * needed
+    else:
+        sizes = struct.unpack(f">{needed}I", moov[stsz + 12:stsz + 12 + 4 * needed])
+
+    if "co64" in tables:
+        chunk_offsets = [offset for offset, in _read_table(moov, tables["co64"], ">Q")]
+    else:
+        chunk_offsets = [offset for offset, in _read_table(moov, tables["stco"], ">I")]
+
+    # stsc runs: each entry applies from its first chunk up to the next entry's
+    runs = _read_table(moov, tables["stsc"], ">III")
+    end = 0
+    sample = 0
+    for index, (first_chunk, samples_per_chunk, _) in enumerate(runs):
+        last_chunk = runs[index + 1][0] - 1 if index + 1 < len(runs) else len(chunk_offsets)
+
+        for chunk in range(first_chunk, last_chunk + 1):
+            if sample >= needed or chunk > len(chunk_offsets):
+                return end or None
+
+            offset = chunk_offsets[chunk - 1]
+            for sample_size in sizes[sample:sample + samples_per_chunk]:
+                offset += sample_size
+            sample += samples_per_chunk
+            end = max(end, offset)
+
+    return end or None
+
+
+def window_byte_end(moov, window_seconds, start=0, end=None):
+    """
+    Returns the file offset just past the last media byte needed to decode
+    the opening window_seconds of every track in the moov payload
+    moov[start:end], or None if any track's sample tables cannot be read.
+    """
+    ends = []
+    for box_type, trak_start, trak_end in iter_child_boxes(moov, start, end):
+        if box_type != "trak":
+            continue
+
+        end = track_window_end(moov, trak_start, trak_end, window_seconds)
+        if end is None:
+            return None
+        ends.append(end)
+
+    return max(ends) if ends else None
+
+
+def write_sampling_window(fetch_range, size, dest_path, window_seconds):
+    """
+    Writes a sparse copy of an MP4/MOV file holding only the container index
+    and the media bytes needed to decode its opening window_seconds.
+
+    Byte offsets are preserved, so the moov sample tables still point at the
+    right places and decoders can read the leading frames normally.
+
+    Args:
+        fetch_range: Callable (start, end) returning an iterable of byte chunks for [start, end).
+        size (int): Total size of the object in bytes.
+        dest_path (str): Local path to write.
+        window_seconds (float): Length of the opening window that must be decodable.
+    Returns:
+        bool: True if a range-limited copy was written, False if the caller should fetch the whole file.
+    """
+    boxes = read_mp4_boxes(fetch_range, size)
+
+    if any(box_type == "moof" for box_type, _, _ in boxes):
+        logger.info("Fragmented MP4, range-limited fetch unavailable")
+        return False
+
+    # A file may hold several mdat boxes; the sample tables say which bytes matter
+    moov_box = next(((offset, box_size) for box_type, offset, box_size in boxes if box_type == "moov"), None)
+
+    if not moov_box or not any(box_type == "mdat" for box_type, _, _ in boxes):
+        logger.info("Not a seekable ISO-BMFF file, range-limited fetch unavailable")
+        return False
+
+    moov_offset, moov_size = moov_box
+
+    moov = read_range(fetch_range, moov_offset, moov_offset + moov_size)
+    payload = find_child_box(moov, "moov")
+    media_end = payload and window_byte_end(moov, window_seconds, *payload)
+
+    if not media_end:
+        logger.info("Could not read the sample tables, range-limited fetch unavailable")
+        return False
+
+    prefix_end = min(media_end, size)
+    duration = parse_movie_duration(moov) or 0
+
+    with open(dest_path, "wb") as f:
+        # Keep the real length so offsets past the fetched prefix stay valid;
+        # the unfetched middle of mdat is left as a hole.
+        f.truncate(size)
+
+        for chunk in fetch_range(0, prefix_end):
+            f.write(chunk)
+
+        if moov_offset + moov_size > prefix_end:
+            f.seek(moov_offset)
+            f.write(moov)
+
+    fetched = prefix_end + (moov_size if moov_offset >= prefix_end else 0)
+    logger.info(f"Fetched {fetched} of {size} bytes ({fetched / max(size, 1):.1%}) covering the first {window_seconds}s of {duration:.0f}s")
+
+    return True
@@ -0,0 +1,152 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    A unit of work in a job pipeline.
+
+    func receives a dict of the outputs of the stages it depends on and
+    returns this stage's output. Checkpointed stages have JSON-serializable
+    outputs that are persisted, so a resumed run can skip them; other stages
+    rerun whenever a stage that still has to run needs their output.
+    """
+
+    def __init__(self, name, func, depends_on=(), checkpoint=False):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.checkpoint = checkpoint
+
+
+class StageError(Exception):
+    """Raised when a stage fails; carries the timeline recorded so far."""
+
+    def __init__(self, stage, error, timeline):
+        super().__init__(f"Stage {stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.timeline = timeline
+
+
+def stages_to_run(stages, completed):
+    """
+    Names of the stages a resumed run has to execute: every incomplete
+    checkpointed or final stage, plus whatever incomplete stages they
+    transitively depend on.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    dependents = {dependency for stage in stages for dependency in stage.depends_on}
+
+    required = [
+        stage.name for stage in stages
+        if stage.name not in completed and (stage.checkpoint or stage.name not in dependents)
+    ]
+
+    needed = set()
+    while required:
+        name = required.pop()
+        if name in needed or name in completed:
+            continue
+        needed.add(name)
+        required.extend(by_name[name].depends_on)
+
+    return needed
+
+
+def run_stages(stages, max_workers=4, completed=None, on_complete=None):
+    """
+    Runs stages as a dependency graph, starting each one as soon as all of
+    its dependencies have finished so that independent branches overlap.
+
+    completed maps stage name to the output of an earlier run; those stages
+    are skipped and their outputs passed on. on_complete(name, output) is
+    called from the scheduling thread as each stage finishes.
+
+    Returns:
+        tuple: (outputs, timeline) where outputs maps stage name to result and
+        timeline lists {stage, start, end, seconds} entries relative to the run start.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [name for name in stage.depends_on if name not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {missing}")
+
+    completed = {name: output for name, output in (completed or {}).items() if name in by_name}
+    needed = stages_to_run(stages, completed)
+
+    if completed:
+        logger.info(f"Resuming with {sorted(completed)} complete, skipping {sorted(set(by_name) - needed)}")
+
+    origin = time.perf_counter()
+    outputs = dict(completed)
+    timeline = []
+    pending = {name: stage for name, stage in by_name.items() if name in needed}
+    running = {}
+
+    def execute(stage, inputs):
+        started = time.perf_counter()
+        try:
+            return stage.func(inputs)
+        finally:
+            finished = time.perf_counter()
+            timeline.append({
+                'stage': stage.name,
+                'start': started - origin,
+                'end': finished - origin,
+                'seconds': finished - started
+            })
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dependency in outputs for dependency in stage.depends_on):
+                    inputs = {dependency: outputs[dependency] for dependency in stage.depends_on}
+                    running[executor.submit(execute, stage, inputs)] = name
+                    del pending[name]
+
+            if not running:
+                raise ValueError(f"Stages {sorted(pending)} have cyclic dependencies")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for other in running:
+                        other.cancel()
+                    raise StageError(name, error, timeline) from error
+                outputs[name] = future.result()
+                if on_complete is not None:
+                    on_complete(name, outputs[name])
+
+    return outputs, sorted(timeline, key=lambda entry: entry['start'])
+
+
+def critical_path(stages, timeline):
+    """Walks back from the last stage to finish along its latest-finishing dependency."""
+    ends = {entry['stage']: entry['end'] for entry in timeline}
+    by_name = {stage.name: stage for stage in stages}
+
+    if not ends:
+        return []
+
+    path = [max(ends, key=ends.get)]
+    while True:
+        dependencies = [name for name in by_name[path[-1]].depends_on if name in ends]
+        if not dependencies:
+            break
+        path.append(max(dependencies, key=ends.get))
+
+    return list(reversed(path))
+
+
+def log_timeline(job_id, stages, timeline):
+    for entry in timeline:
+        logger.info(f"job {job_id} stage {entry['stage']}: {entry['start']:.2f}s -> {entry['end']:.2f}s ({entry['seconds']:.2f}s)")
+    logger.info(f"job {job_id} critical path: {' -> '.join(critical_path(stages, timeline))}")
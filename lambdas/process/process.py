@@ -1,6 +1,7 @@
 import base64
 import sys
 import time
+from functools import partial
 from urllib.parse import parse_qsl
 import boto3
 from botocore.exceptions import ClientError
@@ -10,20 +11,50 @@ import logging
 import os
 from pprint import pformat
 import uuid
-from thumbnail import extract_person_thumbnail, get_random_video_frame
 
 
-import ai_util,box_util
+# box_util (box_sdk_gen) and thumbnail (rembg, onnxruntime, cv2, PIL, numpy)
+# are imported by the stages that need them, keeping them off the cold-start
+# path of events that return early.
+import admission,ai_util,cache_util,media_cache
+from transcript import create_transcript_with_seconds, split_transcript_windows
+from pipeline import Stage, StageError, log_timeline, run_stages
 
 dynamodb = boto3.resource('dynamodb')
 
 JOB_TABLE = os.environ['JOB_TABLE']
 job_table= dynamodb.Table(JOB_TABLE)
 
-s3 = boto3.client('s3')
+s3 = cache_util.get_client('s3')
 storage_bucket = os.environ['STORAGE_BUCKET']
 transcription_bucket = os.environ['TRANSCRIBE_BUCKET']
 
+# Thumbnails are sampled from the opening seconds of the recording
+SAMPLE_WINDOW_SECONDS = 10
+
+# Longest we wait for both the .json and .srt outputs before giving up
+TRANSCRIPT_READY_TIMEOUT = int(os.environ.get('TRANSCRIPT_READY_TIMEOUT', '60'))
+
+# Seconds reserved at the end of an invocation for uploads and cleanup
+JOB_DEADLINE_MARGIN = 30
+
+# Transcripts longer than this are summarized window by window before generation
+LONG_TRANSCRIPT_CHARS = int(os.environ.get('LONG_TRANSCRIPT_CHARS', '60000'))
+TRANSCRIPT_WINDOW_CHARS = int(os.environ.get('TRANSCRIPT_WINDOW_CHARS', '20000'))
+TRANSCRIPT_WINDOW_OVERLAP_LINES = int(os.environ.get('TRANSCRIPT_WINDOW_OVERLAP_LINES', '5'))
+# Optional Box AI agent for window summaries; Box's default agent otherwise
+SUMMARY_AGENT_ID = os.environ.get('BOX_SUMMARY_AGENT_ID')
+WINDOW_SUMMARY_PROMPT = (
+    "summarize this section of a technical talk transcript. keep the names of people, products and "
+    "technologies, the key points and demos, and the MM:SS timestamps where major topics start."
+)
+
+# Completed stage outputs are stored on the job record as stage_<name> attributes
+CHECKPOINT_PREFIX = "stage_"
+
+# Times an S3 event runs this Lambda: the first try plus the two async retries
+MAX_ATTEMPTS = int(os.environ.get('SUMMARIZE_MAX_ATTEMPTS', '3'))
+
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
 logger = logging.getLogger()
 
@@ -36,11 +67,34 @@ elif LOG_LEVEL == "WARN":
 else:
     logger.setLevel(logging.INFO)
 
-def get_box_docgen_credentials():
-    secret_arn = os.environ['BOX_DOCGEN_SECRET_ARN']
-    client = boto3.client('secretsmanager')
-    response = client.get_secret_value(SecretId=secret_arn)
-    return json.loads(response['SecretString'])
+def get_box_docgen_credentials(force_refresh=False):
+    return cache_util.get_secret(os.environ['BOX_DOCGEN_SECRET_ARN'], force_refresh)
+
+def get_box(user_id, force_refresh=False):
+    """
+    Returns the DocGen credentials and a box_util for the user, reusing the
+    client across records and warm invocations until the secret changes.
+    """
+    import box_util
+
+    credentials = get_box_docgen_credentials(force_refresh)
+
+    if force_refresh:
+        # Drop the cached token too, it was issued for the rejected credentials
+        box_util.SharedTokenStorage(credentials['client_id'], user_id).clear()
+
+    box = cache_util.get_or_create(
+        ('box_util', credentials['client_id'], credentials['client_secret'], user_id),
+        lambda: box_util.box_util(
+            credentials['client_id'],
+            credentials['client_secret'],
+            user_id,
+            logger
+        ),
+        refresh=force_refresh
+    )
+
+    return credentials, box
 
 
 def get_job_data(job_id):
@@ -75,6 +129,12 @@ def get_job_data(job_id):
         job_data['file_read_token'] =  item['file_read_token']
         job_data['file_write_token'] =  item['file_write_token']
         job_data['user_id'] =  str(item['user_id'])
+        job_data['content_sha1'] =  item.get('content_sha1')
+        job_data['cache_hit'] =  bool(item.get('cache_hit'))
+        job_data['checkpoints'] = {
+            key[len(CHECKPOINT_PREFIX):]: json.loads(value)
+            for key, value in item.items() if key.startswith(CHECKPOINT_PREFIX)
+        }
         logger.debug("job_data: " + str(job_data))
         
     except Exception as e:
@@ -85,6 +145,20 @@ def get_job_data(job_id):
     return job_data
 
 
+def record_attempt(job_data):
+    """Counts this run on the job record; returns True on the last attempt the job gets."""
+    result = job_table.update_item(
+        Key={'job_id': job_data['job_id']},
+        UpdateExpression="ADD attempts :one",
+        ExpressionAttributeValues={':one': 1},
+        ReturnValues="UPDATED_NEW"
+    )
+    attempt = int(result['Attributes']['attempts'])
+    job_data['final_attempt'] = attempt >= MAX_ATTEMPTS
+
+    return job_data['final_attempt']
+
+
 def delete_job_data(job_id):
     job_table.delete_item(
         Key={
@@ -93,88 +167,153 @@ def delete_job_data(job_id):
     )
 
 
-def create_transcript_with_seconds(entries):
-    
-    transcript = ""
-    second = -1
+def is_complete(output):
+    """None, and dicts or lists holding None (failed AI calls or uploads), are incomplete outputs."""
+    parts = output.values() if isinstance(output, dict) else output if isinstance(output, list) else ()
+    return output is not None and None not in parts
 
-    for entry in entries:
-        
-        if entry['type'] == "punctuation":
-            start = second
-        else:
-            start=int(float(entry['start_time']))
-            
-        if second == -1:
-            second = start
 
-        if start == second:
-            transcript += f"{entry['alternatives'][0]['content']} "
-        else:
-            time_tuple=divmod(second, 60)
-            time_string= f"{time_tuple[0]:02d}:{time_tuple[1]:02d}"
-            transcript += f"\n{time_string} {entry['alternatives'][0]['content']} "
-            second=start
+def require_complete(name, func):
+    """
+    Wraps a checkpointed stage so an incomplete output fails it, leaving the
+    stage for the retry to resume from instead of finishing the job without it.
+    """
+    def run(inputs):
+        output = func(inputs)
+        if not is_complete(output):
+            raise Exception(f"Stage {name} did not complete")
+        return output
+    return run
 
-    return transcript
 
-def process_transcription(transcription_file,job_data,box,ai,video_shared_link, srt_shared_link, credentials):  
+def save_checkpoint(job_data, name, output):
     """
-    "template_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_DOCGEN_TEMPLATE_ID']),
-    "blog_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_BLOG_AGENT_ID']),
-    "tweet_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_TWEET_AGENT_ID']),
-    "linkedin_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_LINKEDIN_AGENT_ID']),
-    "youtube_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_YOUTUBE_AGENT_ID']),
-    "ai_file_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_AI_FILE_ID']),
-    "metadata_template_key"
+    Persists a completed stage output on the job record. Incomplete outputs
+    are left for the retry to redo.
     """
-    try:
-                            
-        meeting_file = transcription_file.replace("transcriptions/","").replace(".json", "")
+    if not is_complete(output):
+        return
+
+    job_table.update_item(
+        Key={'job_id': job_data['job_id']},
+        UpdateExpression="SET #stage = :output",
+        ExpressionAttributeNames={'#stage': CHECKPOINT_PREFIX + name},
+        ExpressionAttributeValues={':output': json.dumps(output)}
+    )
+    job_data['checkpoints'][name] = output
 
-        transcription, entries = ai.get_transcription(meeting_file)
 
-        transcript = create_transcript_with_seconds(entries)
-        
-        logger.debug(f"transcription {transcription} transcript with seconds {transcript}")
+def clear_checkpoint(job_data, name):
+    """Drops a stored step output so the next attempt runs the step again."""
+    job_table.update_item(
+        Key={'job_id': job_data['job_id']},
+        UpdateExpression="REMOVE #stage",
+        ExpressionAttributeNames={'#stage': CHECKPOINT_PREFIX + name}
+    )
+    job_data['checkpoints'].pop(name, None)
 
-        metadata = box.box_ai_extract(transcription, credentials['ai_file_id'], credentials['metadata_template_key'])
 
-        blog = box.ask_box_ai(
-            transcription,
-            "write a blog post highlighting the technology described in the provided transcription.",
-            credentials['blog_agent_id'],
-            credentials['ai_file_id']
-        )
+def checkpointed(job_data, name, func):
+    """Returns the stored output of a step from an earlier attempt, or runs it and stores the result."""
+    if name in job_data['checkpoints']:
+        logger.info(f"job {job_data['job_id']} reusing checkpoint {name}")
+        return job_data['checkpoints'][name]
 
-        logger.debug(f"blog {blog}")
+    output = func()
+    save_checkpoint(job_data, name, output)
+    return output
 
-        tweet = box.ask_box_ai(
-            transcription,
-            "write a tweet highlighting the technology described in the provided transcription.",
-            credentials['tweet_agent_id'],
-            credentials['ai_file_id']
-        )
 
-        logger.debug(f"tweet {tweet}")
+def build_stages(meeting_file, job_data, box, ai, video_shared_link, srt_shared_link, credentials, deadline=None):
+    """
+    Describes the summarize job as a dependency graph. The thumbnail branch
+    does not depend on any AI output, so it runs while the Box AI and DocGen
+    calls are in flight. Stages whose outputs are Box ids or AI texts are
+    checkpointed; the transcript, video and frames are rebuilt when needed.
+    """
 
-        linkedin = box.ask_box_ai(
-            transcription,
-            "write a linkedin post highlighting the technology described in the provided transcription.",
-            credentials['linkedin_agent_id'],
-            credentials['ai_file_id']
-        )
+    def load_transcript(inputs):
+        transcription, entries = ai.stream_transcription(meeting_file)
 
-        logger.debug(f"linkedin {linkedin}")
+        transcript = create_transcript_with_seconds(entries)
 
-        youtube_description = box.ask_box_ai(
-            transcript,
-            "write a youtube description highlighting the technology described in the provided transcription.",
-            credentials['youtube_agent_id'],
-            credentials['ai_file_id']
-        )
+        logger.debug(f"transcription {transcription} transcript with seconds {transcript}")
 
-        logger.debug(f"youtube {youtube_description}")
+        return transcription, transcript
+
+    def summarize_windows(transcript):
+        windows = split_transcript_windows(transcript, TRANSCRIPT_WINDOW_CHARS, TRANSCRIPT_WINDOW_OVERLAP_LINES)
+
+        summaries = box.run_ai_requests({
+            index: partial(box.ask_box_ai, window, WINDOW_SUMMARY_PROMPT, SUMMARY_AGENT_ID, credentials['ai_file_id'])
+            for index, window in enumerate(windows)
+        })
+
+        logger.info(f"Summarized {sum(1 for summary in summaries.values() if summary)} of {len(windows)} transcript windows")
+
+        return "\n\n".join(summaries[index] for index in range(len(windows)) if summaries[index])
+
+    def generate_content(inputs):
+        transcription, transcript = inputs['transcript']
+
+        if len(transcription) > LONG_TRANSCRIPT_CHARS:
+            # Map: summarize overlapping windows in parallel. Reduce: every
+            # output below is generated from the combined summaries.
+            summary = summarize_windows(transcript)
+            if summary:
+                transcription = transcript = summary
+
+        results = box.run_ai_requests({
+            'metadata': partial(
+                box.box_ai_extract,
+                transcription,
+                credentials['ai_file_id'],
+                credentials['metadata_template_key']
+            ),
+            'blog': partial(
+                box.ask_box_ai,
+                transcription,
+                "write a blog post highlighting the technology described in the provided transcription.",
+                credentials['blog_agent_id'],
+                credentials['ai_file_id']
+            ),
+            'tweet': partial(
+                box.ask_box_ai,
+                transcription,
+                "write a tweet highlighting the technology described in the provided transcription.",
+                credentials['tweet_agent_id'],
+                credentials['ai_file_id']
+            ),
+            'linkedin': partial(
+                box.ask_box_ai,
+                transcription,
+                "write a linkedin post highlighting the technology described in the provided transcription.",
+                credentials['linkedin_agent_id'],
+                credentials['ai_file_id']
+            ),
+            'youtube_description': partial(
+                box.ask_box_ai,
+                transcript,
+                "write a youtube description highlighting the technology described in the provided transcription.",
+                credentials['youtube_agent_id'],
+                credentials['ai_file_id']
+            )
+        })
+
+        logger.debug(f"blog {results['blog']}")
+        logger.debug(f"tweet {results['tweet']}")
+        logger.debug(f"linkedin {results['linkedin']}")
+        logger.debug(f"youtube {results['youtube_description']}")
+
+        return results
+
+    def generate_document(inputs):
+        # On the last attempt any of these may be None
+        metadata = inputs['ai']['metadata'] or {}
+        blog = inputs['ai']['blog']
+        tweet = inputs['ai']['tweet']
+        linkedin = inputs['ai']['linkedin']
+        youtube_description = inputs['ai']['youtube_description']
 
         doc_contents = box.create_docgen_json(
             topic=metadata.get("topic") or "unknown",
@@ -195,30 +334,127 @@ def process_transcription(transcription_file,job_data,box,ai,video_shared_link,
 
         logger.debug(f"doc_contents {doc_contents}")
 
-        box.generate_document(doc_contents, job_data['folder_id'], meeting_file, credentials['template_id'])
+        return box.generate_document(doc_contents, job_data['folder_id'], meeting_file, credentials['template_id'], wait=False)
+
+    def collect_document(inputs):
+        from box_util import DocGenJobV2025R0StatusField
+
+        # The batch id is checkpointed before polling, so a retry after a
+        # slow batch collects its document instead of generating another
+        batch_id = checkpointed(job_data, 'docgen_batch', partial(generate_document, inputs))
+
+        output_file_id = box.wait_for_document(batch_id, deadline)
+
+        if output_file_id is None:
+            status, _ = box.check_document(batch_id)
+            if status in (DocGenJobV2025R0StatusField.FAILED, DocGenJobV2025R0StatusField.COMPLETED_WITH_ERROR):
+                # Nothing was written, so the retry starts a new batch
+                clear_checkpoint(job_data, 'docgen_batch')
+
+        return output_file_id
+
+    def create_thumbnail_folder(inputs):
+        return box.create_folder(job_data['folder_id'])
+
+    def download_video(inputs):
+        if ai.object_exists(ai.recordings_store, job_data['file_name']):
+            return ai.download_video(job_data['file_name'], "/tmp/video.mp4", window_seconds=SAMPLE_WINDOW_SECONDS)
+
+        # Deduplicated jobs never upload the recording to S3; read it from Box instead
+        return box.download_video(job_data['file_id'], "/tmp/video.mp4", window_seconds=SAMPLE_WINDOW_SECONDS)
 
-        thumbnail_folder_id = box.create_folder(job_data['folder_id'])
-        video_content = ai.get_video(job_data['file_name'])  # Replace with the path to your video file
-        video_file = "/tmp/video.mp4"
-        with open(video_file, "wb") as f:
-            f.write(video_content)
+    def extract_frames(inputs):
+        from thumbnail import sample_video_frames, select_thumbnail_frames
 
         frame_count = 10
+        candidate_count = 40
 
-        for i in range(frame_count):
-            file_name = get_random_video_frame(video_file)
+        candidates = [frame for _, frame in sample_video_frames(inputs['video'], candidate_count, duration=SAMPLE_WINDOW_SECONDS)]
 
-            with open(file_name, 'rb') as f: # type: ignore
-                image_bytes = f.read()
-                result_bytes = extract_person_thumbnail(
-                    input_data=image_bytes,
-                    target_size=(1920, 1080),  # YouTube thumbnail size
-                    preserve_original_lighting=True  # Keep natural lighting
-                )
+        return select_thumbnail_frames(candidates, frame_count)
+
+    def segment_frames(inputs):
+        from thumbnail import extract_person_thumbnails, session_registry
+
+        thumbnails = extract_person_thumbnails(
+            inputs['frames'],
+            target_size=(1920, 1080),  # YouTube thumbnail size
+            preserve_original_lighting=True  # Keep natural lighting
+        )
+
+        logger.info(f"rembg session timings: {session_registry.report()}")
+
+        return thumbnails
+
+    def upload_thumbnail(name, result_bytes, folder_id):
+        uploaded_file = box.upload_file(name, result_bytes, folder_id)
+        # Failed uploads return a status instead of a file entry
+        return uploaded_file.get('id')
+
+    def upload_thumbnails(inputs):
+        uploaded = []
+        for i, result_bytes in enumerate(inputs['segmentation']):
             if result_bytes is not None:
-                box.upload_file(f"{meeting_file}_thumbnail_{i}.jpg", result_bytes, thumbnail_folder_id)
+                # Each upload is checkpointed so a retry never uploads a thumbnail twice
+                uploaded.append(checkpointed(
+                    job_data, f"thumbnail_upload_{i}",
+                    partial(upload_thumbnail, f"{meeting_file}_thumbnail_{i}.jpg", result_bytes, inputs['thumbnail_folder'])
+                ))
+
+        print(f"Thumbnail extraction complete.")
+
+        return uploaded
+
+    # Failed Box AI calls return None. A partial output is never checkpointed
+    # and fails the stage so a retry can fill it in, except on the last
+    # attempt, where the document is built from whatever was generated.
+    if job_data.get('final_attempt'):
+        content_stage = generate_content
+    else:
+        content_stage = require_complete('ai', generate_content)
+
+    return [
+        Stage('transcript', load_transcript),
+        Stage('ai', content_stage, depends_on=['transcript'], checkpoint=True),
+        Stage('docgen', require_complete('docgen', collect_document), depends_on=['ai'], checkpoint=True),
+        Stage('thumbnail_folder', require_complete('thumbnail_folder', create_thumbnail_folder), checkpoint=True),
+        Stage('video', download_video),
+        Stage('frames', extract_frames, depends_on=['video']),
+        Stage('segmentation', segment_frames, depends_on=['frames']),
+        Stage('thumbnail_upload', require_complete('thumbnail_upload', upload_thumbnails), depends_on=['segmentation', 'thumbnail_folder'], checkpoint=True)
+    ]
+
+def process_transcription(transcription_file,job_data,box,ai,video_shared_link, srt_shared_link, credentials, deadline=None):  
+    """
+    "template_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_DOCGEN_TEMPLATE_ID']),
+    "blog_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_BLOG_AGENT_ID']),
+    "tweet_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_TWEET_AGENT_ID']),
+    "linkedin_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_LINKEDIN_AGENT_ID']),
+    "youtube_agent_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_YOUTUBE_AGENT_ID']),
+    "ai_file_id": cdk.SecretValue.unsafe_plain_text(box_config['BOX_AI_FILE_ID']),
+    "metadata_template_key"
+    """
+    try:
+                            
+        meeting_file = transcription_file.replace("transcriptions/","").replace(".json", "")
+
+        stages = build_stages(meeting_file, job_data, box, ai, video_shared_link, srt_shared_link, credentials, deadline)
+
+        completed = {stage.name: job_data['checkpoints'][stage.name] for stage in stages if stage.name in job_data['checkpoints']}
+
+        stage_by_name = {stage.name: stage for stage in stages}
 
-            print(f"Thumbnail extraction complete.")
+        def on_complete(name, output):
+            if stage_by_name[name].checkpoint:
+                save_checkpoint(job_data, name, output)
+
+        try:
+            outputs, timeline = run_stages(stages, completed=completed, on_complete=on_complete)
+        except StageError as e:
+            log_timeline(job_data['job_id'], stages, e.timeline)
+            raise
+
+        log_timeline(job_data['job_id'], stages, timeline)
 
         return {
             'statusCode' : 200
@@ -239,7 +475,7 @@ def lambda_handler(event, context):
     logger.debug(f"summarize->lambda_handler: Event: " + pformat(event))
     logger.debug(f"summarize->lambda_handler: Context: " + pformat(context))
 
-    ai = ai_util.ai_util()
+    ai = cache_util.get_or_create('ai_util', ai_util.ai_util)
 
     for record in event['Records']:
 
@@ -251,18 +487,23 @@ def lambda_handler(event, context):
                 'statusCode' : 200
             }
 
-        time.sleep(30)
+        job_id = s3_key.replace("transcriptions/","").replace(".srt","").replace(".json","")
 
-        credentials = get_box_docgen_credentials()
+        # Leave headroom to process the job after waiting
+        deadline = time.time() + min(TRANSCRIPT_READY_TIMEOUT, context.get_remaining_time_in_millis() / 1000 / 2)
 
-        job_data=get_job_data(s3_key.replace("transcriptions/","").replace(".srt","").replace(".json",""))
+        if not ai.wait_for_transcription(job_id, deadline):
+            raise Exception(f"Transcription artifacts for {job_id} were not ready in time")
 
-        box = box_util.box_util(
-            credentials['client_id'],
-            credentials['client_secret'],
-            job_data['user_id'],
-            logger    
-        )
+        job_data=get_job_data(job_id)
+
+        if record_attempt(job_data):
+            logger.warning(f"job {job_id} final attempt, partial AI content will not be retried")
+
+        # The Transcribe job has finished, so its slot can go to the next recording
+        admission.release_job(job_id)
+
+        credentials, box = get_box(job_data['user_id'])
 
         json_file = ""
         srt_file = ""
@@ -281,18 +522,45 @@ def lambda_handler(event, context):
         
         print(f"Processing transcription file: {json_file} and subtitles file: {srt_file}")
 
-        video_shared_link = box.get_shared_link(job_data['file_id'])
+        try:
+            video_shared_link = checkpointed(job_data, 'video_shared_link', partial(box.get_shared_link, job_data['file_id']))
+        except Exception as e:
+            from box_util import is_auth_error
+            if not is_auth_error(e):
+                raise
+            # The cached secret may have been rotated
+            logger.warning(f"Box authentication failed, refreshing credentials: {e}")
+            credentials, box = get_box(job_data['user_id'], force_refresh=True)
+            video_shared_link = checkpointed(job_data, 'video_shared_link', partial(box.get_shared_link, job_data['file_id']))
+
+        srt_file_id = checkpointed(
+            job_data, 'srt_upload',
+            lambda: box.upload_file(srt_file.replace("transcriptions/",""), ai.get_subtitles(srt_file.replace("transcriptions/","").replace(".srt","")), job_data['folder_id'])['id']
+        )
+        srt_shared_link = checkpointed(job_data, 'srt_shared_link', partial(box.get_shared_link, srt_file_id))
+
+        # Stop waiting on DocGen while there is still time to clean up
+        job_deadline = time.time() + context.get_remaining_time_in_millis() / 1000 - JOB_DEADLINE_MARGIN
+
+        result = process_transcription(json_file, job_data, box, ai, video_shared_link, srt_shared_link, credentials, job_deadline)
 
-        uploaded_file = box.upload_file(srt_file.replace("transcriptions/",""), ai.get_subtitles(srt_file.replace("transcriptions/","").replace(".srt","")), job_data['folder_id'])
-        srt_shared_link = box.get_shared_link(uploaded_file['id'])
+        if result['statusCode'] != 200:
+            # Keep the job record, its checkpoints and the artifacts so the
+            # retry resumes at the first incomplete stage
+            raise Exception(result['body'])
 
-        process_transcription(json_file, job_data, box, ai, video_shared_link, srt_shared_link, credentials)
+        if not job_data['cache_hit']:
+            try:
+                media_cache.store(job_data['content_sha1'], json_file, srt_file)
+            except Exception as e:
+                logger.warning(f"Could not cache transcription for {job_data['content_sha1']}: {e}")
 
         delete_job_data(job_data['job_id'])
 
-        # Delete transcription files and original video
+        # Delete transcription files, original video and the extracted audio
         video_file_key = f"videos/{job_data['file_name']}"
-        ai.delete_files(json_file, srt_file, video_file_key)
+        media_file_key = "videos/" + job_data['job_uri'].split("/", 3)[-1]
+        ai.delete_files(json_file, srt_file, *dict.fromkeys([video_file_key, media_file_key]))
 
 
     return {
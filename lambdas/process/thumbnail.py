@@ -2,7 +2,10 @@ import os
 import io
 import base64
 import logging
-from typing import Union, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Union, Optional, Tuple, Sequence
 from PIL import Image, ImageFilter, ImageEnhance
 import numpy as np
 import cv2
@@ -12,12 +15,112 @@ import random
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+DEFAULT_PROVIDERS = ('CPUExecutionProvider',)
+SESSION_BUDGET_BYTES = int(os.environ.get('REMBG_SESSION_BUDGET_MB', '2048')) * 1024 * 1024
+
+
+def _current_rss_bytes() -> int:
+    """Resident set size of this process, or 0 where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class SessionRegistry:
+    """
+    Process-wide cache of rembg sessions keyed by model name and provider list.
+    Sessions survive across warm Lambda invocations and are evicted least
+    recently used first once their estimated footprint exceeds the budget.
+    """
+
+    def __init__(self, budget_bytes: int = SESSION_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.timings = {'cold_seconds': 0.0, 'cold_loads': 0, 'warm_seconds': 0.0, 'warm_hits': 0}
+
+    def get(self, model_name: str, providers: Sequence[str] = DEFAULT_PROVIDERS):
+        """Return a cached session for the model, loading it on first use."""
+        key = (model_name, tuple(providers))
+        started = time.perf_counter()
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                self.timings['warm_hits'] += 1
+                self.timings['warm_seconds'] += time.perf_counter() - started
+                return session
+
+            rss_before = _current_rss_bytes()
+            session = new_session(model_name, providers=list(providers))
+            elapsed = time.perf_counter() - started
+
+            self._sessions[key] = session
+            self._sizes[key] = max(_current_rss_bytes() - rss_before, self._model_file_size(model_name))
+            self.timings['cold_loads'] += 1
+            self.timings['cold_seconds'] += elapsed
+            logger.info(f"Loaded rembg session {key} in {elapsed:.2f}s (~{self._sizes[key] // (1024 * 1024)} MB)")
+
+            self._evict_over_budget(keep=key)
+            return session
+
+    def evict(self, model_name: str, providers: Sequence[str] = DEFAULT_PROVIDERS) -> bool:
+        """Drop a cached session. Returns True if one was cached."""
+        key = (model_name, tuple(providers))
+        with self._lock:
+            self._sizes.pop(key, None)
+            return self._sessions.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._sizes.clear()
+
+    def report(self) -> dict:
+        """Cold/warm timing summary, suitable for logging once per job."""
+        with self._lock:
+            return {
+                **self.timings,
+                'cached_sessions': [f"{name}:{','.join(providers)}" for name, providers in self._sessions],
+                'cached_bytes': sum(self._sizes.values())
+            }
+
+    def _evict_over_budget(self, keep):
+        while sum(self._sizes.values()) > self.budget_bytes and len(self._sessions) > 1:
+            key = next(k for k in self._sessions if k != keep)
+            self._sessions.pop(key)
+            self._sizes.pop(key)
+            logger.info(f"Evicted rembg session {key} to stay under {self.budget_bytes} byte budget")
+
+    @staticmethod
+    def _model_file_size(model_name: str) -> int:
+        home = os.environ.get('U2NET_HOME', os.path.join(os.path.expanduser('~'), '.u2net'))
+        try:
+            return os.path.getsize(os.path.join(home, f"{model_name}.onnx"))
+        except OSError:
+            return 0
+
+
+session_registry = SessionRegistry()
+
 
 class ThumbnailProcessor:
     """
     Professional thumbnail processor optimized for AWS Lambda.
     Extracts person from video frames with transparent background.
     """
+
+    # rembg preprocessing (mean, std, input size) for models that can be batched
+    BATCH_NORMALIZATION = {
+        'u2net': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+        'u2netp': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+        'u2net_human_seg': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+        'silueta': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    }
     
     def __init__(self, model_name: str = 'u2net'):
         """
@@ -31,12 +134,11 @@ class ThumbnailProcessor:
         self._initialize_session()
     
     def _initialize_session(self):
-        """Initialize rembg session with error handling."""
+        """Fetch the shared rembg session with error handling."""
         try:
             # Force CPU provider to avoid CoreML permission issues on macOS
-            providers = ['CPUExecutionProvider']
-            self.session = new_session(self.model_name, providers=providers)
-            logger.info(f"Initialized rembg session with model: {self.model_name} using CPU provider")
+            self.session = session_registry.get(self.model_name, DEFAULT_PROVIDERS)
+            logger.debug(f"Using rembg session with model: {self.model_name} using CPU provider")
         except Exception as e:
             logger.error(f"Failed to initialize rembg session: {str(e)}")
             raise
@@ -102,11 +204,101 @@ class ThumbnailProcessor:
             logger.error(f"Error processing image: {str(e)}")
             raise
     
-    def _load_image(self, input_data: Union[bytes, str, Image.Image]) -> Image.Image:
+    def process_batch(self,
+                      frames: Sequence[Union[bytes, str, Image.Image, np.ndarray]],
+                      enhance_quality: bool = True,
+                      preserve_original_lighting: bool = True,
+                      target_size: Optional[Tuple[int, int]] = None) -> List[bytes]:
+        """
+        Process several frames with a single segmentation inference call.
+        
+        Frames are preprocessed individually, stacked into one NCHW tensor and
+        run through the ONNX session together; the per-frame masks are then
+        applied exactly as in process_image.
+        
+        Args:
+            frames: Images as bytes, base64 strings, file paths, PIL Images or RGB arrays
+            enhance_quality: Apply professional enhancement for thumbnails
+            preserve_original_lighting: Keep original lighting and colors (recommended)
+            target_size: Optional resize target (width, height)
+        
+        Returns:
+            PNG image bytes with transparent background, one per input frame
+        """
+        try:
+            originals = [self._load_image(frame) for frame in frames]
+            
+            if preserve_original_lighting:
+                segmentation_images = [self._enhance_input(image) if enhance_quality else image for image in originals]
+            else:
+                originals = [self._enhance_input(image) if enhance_quality else image for image in originals]
+                segmentation_images = originals
+            
+            if target_size:
+                originals = [self._smart_resize(image, target_size) for image in originals]
+                segmentation_images = [self._smart_resize(image, target_size) for image in segmentation_images]
+            
+            masks = self._predict_masks(segmentation_images)
+            
+            results = []
+            for image, mask in zip(originals, masks):
+                if preserve_original_lighting:
+                    output_image = image.convert('RGB')
+                    output_image.putalpha(mask)
+                else:
+                    # Match rembg's cutout, which blanks pixels outside the mask
+                    output_image = Image.composite(image.convert('RGBA'), Image.new('RGBA', image.size, 0), mask)
+                
+                if enhance_quality:
+                    output_image = self._enhance_output(output_image, preserve_lighting=preserve_original_lighting)
+                
+                results.append(self._image_to_bytes(output_image))
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error processing batch: {str(e)}")
+            raise
+    
+    def _predict_masks(self, images: List[Image.Image]) -> List[Image.Image]:
+        """Predict segmentation masks for all images in one ONNX run."""
+        if not self.session:
+            raise RuntimeError("rembg session not initialized")
+        
+        normalization = self.BATCH_NORMALIZATION.get(self.model_name)
+        if normalization is None or len(images) < 2:
+            return [self.session.predict(image)[0] for image in images]
+        
+        mean, std, size = normalization
+        feeds = [self.session.normalize(image, mean, std, size) for image in images]
+        input_name = next(iter(feeds[0]))
+        batch = np.concatenate([feed[input_name] for feed in feeds], axis=0)
+        
+        try:
+            outputs = self.session.inner_session.run(None, {input_name: batch})
+        except Exception as e:
+            # Some exported models pin the batch dimension to 1
+            logger.warning(f"Batched inference failed for {self.model_name}, falling back to per-frame: {str(e)}")
+            return [self.session.predict(image)[0] for image in images]
+        
+        masks = []
+        for image, prediction in zip(images, outputs[0][:, 0, :, :]):
+            low, high = np.min(prediction), np.max(prediction)
+            prediction = (prediction - low) / max(high - low, 1e-6)
+            mask = Image.fromarray((prediction * 255).astype('uint8'), mode='L')
+            masks.append(mask.resize(image.size, Image.Resampling.LANCZOS))
+        
+        return masks
+    
+    def _load_image(self, input_data: Union[bytes, str, Image.Image, np.ndarray]) -> Image.Image:
         """Load image from various input formats."""
         if isinstance(input_data, Image.Image):
             return input_data.convert('RGB')
         
+        elif isinstance(input_data, np.ndarray):
+            # RGB frame as produced by sample_video_frames
+            return Image.fromarray(input_data).convert('RGB')
+        
         elif isinstance(input_data, bytes):
             return Image.open(io.BytesIO(input_data)).convert('RGB')
         
@@ -281,6 +473,31 @@ def extract_person_thumbnail(input_data: Union[bytes, str],
         target_size=target_size
     )
 
+def extract_person_thumbnails(frames: Sequence[Union[bytes, str, np.ndarray]],
+                              target_size: Optional[Tuple[int, int]] = (1280, 720),
+                              model: str = 'u2net',
+                              preserve_original_lighting: bool = True) -> List[bytes]:
+    """
+    Batched variant of extract_person_thumbnail.
+    Segments all frames with a single model inference call.
+    
+    Args:
+        frames: Images as bytes, base64 strings or RGB arrays
+        target_size: Target size for thumbnail (width, height). Default: 1280x720
+        model: rembg model to use ('u2net', 'u2net_human_seg', 'silueta')
+        preserve_original_lighting: Keep original lighting/colors (recommended for natural look)
+    
+    Returns:
+        PNG image bytes with transparent background, one per frame
+    """
+    processor = ThumbnailProcessor(model_name=model)
+    return processor.process_batch(
+        frames,
+        enhance_quality=True,
+        preserve_original_lighting=preserve_original_lighting,
+        target_size=target_size
+    )
+
 def get_random_video_frame(video_path):
     """
     Extracts and saves a random frame from a video file.
@@ -334,4 +551,139 @@ def get_random_video_frame(video_path):
     else:
         print(f"Error: Could not read frame {random_frame_index}.")
         cap.release()
-        return None
\ No newline at end of file
+        return None
+
+def sample_video_frames(video_path, count=10, duration=10, rng=None):
+    """
+    Samples distinct frames from the start of a video in a single forward pass.
+
+    The video is opened once and all frame indices are chosen up front. Frames
+    are decoded in ascending order, skipping unwanted ones with grab() instead
+    of seeking, and nothing is written to disk.
+
+    Args:
+        video_path (str): The path to the video file.
+        count (int): Number of frames to sample.
+        duration (float): Length of the sampling window from the start, in seconds.
+        rng (random.Random): Optional random source for reproducible sampling.
+    Yields:
+        tuple: (frame_index, frame) where frame is an RGB numpy array.
+    """
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        logger.error(f"Could not open video file at {video_path}")
+        return
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        if total_frames <= 0:
+            logger.error(f"Video {video_path} contains no frames.")
+            return
+
+        max_frame = min(int(fps * duration), total_frames) if fps > 0 else total_frames
+        max_frame = max(max_frame, 1)
+
+        frame_indices = sorted((rng or random).sample(range(max_frame), min(count, max_frame)))
+
+        position = 0
+        for frame_index in frame_indices:
+            # Decode forward to the wanted frame without converting the skipped ones
+            while position < frame_index:
+                if not cap.grab():
+                    logger.error(f"Video {video_path} ended at frame {position}, before frame {frame_index}.")
+                    return
+                position += 1
+
+            ret, frame = cap.read()
+            position += 1
+
+            if not ret:
+                logger.error(f"Could not read frame {frame_index}.")
+                return
+
+            yield frame_index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        cap.release()
+
+def score_frames(frames, size=(160, 90)):
+    """
+    Scores candidate frames on sharpness, exposure and contrast.
+
+    Frames are reduced to small grayscale images and scored as one stacked
+    array, so a large candidate pool costs far less than a segmentation pass.
+
+    Args:
+        frames (list): RGB numpy arrays.
+        size (tuple): (width, height) the frames are reduced to before scoring.
+    Returns:
+        np.ndarray: One score per frame, higher is better.
+    """
+    gray = np.stack([
+        cv2.resize(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), size, interpolation=cv2.INTER_AREA)
+        for frame in frames
+    ]).astype(np.float32) / 255.0
+
+    # 4-neighbour Laplacian over the whole stack; its variance measures focus
+    laplacian = (gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:] + gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1]
+                 - 4 * gray[:, 1:-1, 1:-1])
+    sharpness = laplacian.var(axis=(1, 2))
+    exposure = 1.0 - np.abs(gray.mean(axis=(1, 2)) - 0.5) * 2
+    contrast = gray.std(axis=(1, 2))
+
+    sharpness = sharpness / max(float(sharpness.max()), 1e-6)
+    contrast = contrast / max(float(contrast.max()), 1e-6)
+
+    return 0.5 * sharpness + 0.25 * exposure + 0.25 * contrast
+
+
+def dhash_frames(frames, hash_size=8):
+    """
+    Computes a difference hash for each frame.
+
+    Args:
+        frames (list): RGB numpy arrays.
+        hash_size (int): Hash edge length; hashes are hash_size * hash_size bits.
+    Returns:
+        np.ndarray: Boolean array of shape (len(frames), hash_size * hash_size).
+    """
+    gray = np.stack([
+        cv2.resize(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        for frame in frames
+    ]).astype(np.int16)
+
+    return (gray[:, :, 1:] > gray[:, :, :-1]).reshape(len(frames), -1)
+
+
+def select_thumbnail_frames(frames, count=10, max_hash_distance=6):
+    """
+    Picks the best distinct frames from a candidate pool.
+
+    Candidates are ranked by score_frames and accepted greedily, skipping any
+    frame whose dHash is within max_hash_distance bits of one already kept.
+
+    Args:
+        frames (list): RGB numpy arrays.
+        count (int): Maximum number of frames to return.
+        max_hash_distance (int): Hamming distance at or below which frames count as duplicates.
+    Returns:
+        list: Up to count RGB numpy arrays, best first.
+    """
+    if not frames:
+        return []
+
+    scores = score_frames(frames)
+    hashes = dhash_frames(frames)
+
+    kept = []
+    for index in np.argsort(-scores):
+        if kept and (hashes[kept] != hashes[index]).sum(axis=1).min() <= max_hash_distance:
+            continue
+        kept.append(index)
+        if len(kept) == count:
+            break
+
+    logger.info(f"Selected {len(kept)} distinct frames from {len(frames)} candidates")
+    return [frames[index] for index in kept]
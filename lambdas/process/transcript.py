@@ -0,0 +1,198 @@
+import codecs
+import json
+
+def iter_transcript_with_seconds(entries):
+    """
+    Yields the per-second transcript one line at a time. Joining the lines
+    gives exactly the text create_transcript_with_seconds returns; entries
+    can be any iterable of Transcribe items, including a stream.
+    """
+    second = -1
+    line = []
+
+    for entry in entries:
+        
+        if entry['type'] == "punctuation":
+            start = second
+        else:
+            start = int(float(entry['start_time']))
+            
+        if second == -1:
+            second = start
+
+        if start != second:
+            yield "".join(line)
+            # The new line is labelled with the previous line's second, one
+            # line late, exactly as the original string-concatenating builder did
+            time_tuple = divmod(second, 60)
+            line = [f"\n{time_tuple[0]:02d}:{time_tuple[1]:02d} "]
+            second = start
+
+        line.append(entry['alternatives'][0]['content'])
+        line.append(" ")
+
+    if line:
+        yield "".join(line)
+
+
+def create_transcript_with_seconds(entries):
+    return "".join(iter_transcript_with_seconds(entries))
+
+
+def split_transcript_windows(transcript, max_chars, overlap_lines=0):
+    """
+    Splits a per-second transcript into windows of about max_chars on line
+    (timestamp) boundaries. Consecutive windows share overlap_lines lines so
+    context is not lost at the cut. Every window takes at least one line
+    the previous one did not, even if that puts it over max_chars.
+    """
+    lines = transcript.split("\n")
+    windows = []
+    start = 0
+    covered = 0
+
+    while start < len(lines):
+        end = start
+        size = 0
+        while end < len(lines) and (end <= covered or size + len(lines[end]) + 1 <= max_chars):
+            size += len(lines[end]) + 1
+            end += 1
+
+        windows.append("\n".join(lines[start:end]))
+
+        if end >= len(lines):
+            break
+        start = max(end - overlap_lines, start + 1)
+        covered = end
+
+    return windows
+
+
+class _JsonStream:
+    """
+    Minimal pull parser over an iterable of UTF-8 byte chunks. Containers are
+    walked member by member and only the values asked for are decoded, so
+    memory is bounded by the largest single value plus one chunk.
+    """
+
+    _decoder = json.JSONDecoder()
+    _whitespace = " \t\n\r"
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._exhausted = False
+        self.text = ""
+        self.pos = 0
+
+    def _fill(self):
+        if self._exhausted:
+            return False
+
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._exhausted = True
+            decoded = self._utf8.decode(b"", final=True)
+        else:
+            decoded = self._utf8.decode(chunk)
+
+        self.text = self.text[self.pos:] + decoded
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in self._whitespace:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}, found {self.text[self.pos]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # The value continues in the next chunk
+                if not self._fill():
+                    raise
+                continue
+
+            # A number near the end of the buffer may still be incomplete: its
+            # digits can run on, or it can stop short at a '.' or exponent
+            if (not self._exhausted and isinstance(value, (int, float))
+                    and (end >= len(self.text) - 1 or self.text[end] in ".eE+-")):
+                self._fill()
+                continue
+
+            self.pos = end
+            return value
+
+    def members(self):
+        """Yields the keys of the object whose '{' was just consumed; the caller consumes each value."""
+        while True:
+            char = self.peek()
+            if char == '}':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+            key = self.value()
+            self.expect(':')
+            yield key
+
+    def elements(self):
+        """Yields the elements of the array that starts at the current position."""
+        self.expect('[')
+        while True:
+            char = self.peek()
+            if char == ']':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+            yield self.value()
+
+
+def stream_transcribe_output(chunks):
+    """
+    Incrementally parses an Amazon Transcribe output document.
+
+    Args:
+        chunks: Iterable of UTF-8 byte chunks, e.g. an S3 body's iter_chunks().
+    Returns:
+        tuple: (transcript text, iterator over results.items). The items are
+        decoded one at a time as the iterator is consumed.
+    """
+    stream = _JsonStream(chunks)
+    stream.expect('{')
+
+    for key in stream.members():
+        if key != 'results':
+            stream.value()
+            continue
+
+        stream.expect('{')
+        transcript = ""
+
+        for results_key in stream.members():
+            if results_key == 'transcripts':
+                transcripts = stream.value()
+                transcript = transcripts[0]['transcript'] if transcripts else ""
+            elif results_key == 'items':
+                return transcript, stream.elements()
+            else:
+                stream.value()
+
+        return transcript, iter(())
+
+    return "", iter(())
@@ -4,19 +4,93 @@ import hmac
 import os
 import datetime
 import json
+import threading
+import time
 import boto3
 
-from box_sdk_gen import (
-    BoxClient, 
-    BoxDeveloperTokenAuth,
-    ByteStream
-)
+import cache_util
+
+
+# Minimum time between forced key refreshes, so badly signed traffic cannot
+# turn every rejected request into a Secrets Manager call. A new container
+# reads the keys on first use, so its clock starts at import.
+KEY_REFRESH_INTERVAL_SECONDS = 60
+
+# Deliveries signed longer ago than this are rejected as replays, as the Box SDKs do
+MAX_DELIVERY_AGE_SECONDS = 600
+
+_key_refresh_lock = threading.Lock()
+_last_key_refresh = time.monotonic()
+
+def get_box_credentials(force_refresh=False):
+    return cache_util.get_secret(os.environ['BOX_SKILL_SECRET_ARN'], force_refresh)
+
+def compute_signature(body, headers, signature_key):
+    if signature_key is None:
+        return None
+    if headers.get('box-signature-version') != '1':
+        return None
+    if headers.get('box-signature-algorithm') != 'HmacSHA256':
+        return None
+    if headers.get('box-delivery-timestamp') is None:
+        return None
+
+    encoded_signature_key = signature_key.encode('utf-8')
+    encoded_delivery_time_stamp = headers.get('box-delivery-timestamp').encode('utf-8')
+    new_hmac = hmac.new(encoded_signature_key, digestmod=hashlib.sha256)
+    new_hmac.update(body + encoded_delivery_time_stamp)
+    signature = base64.b64encode(new_hmac.digest()).decode()
+    return signature
+
+def is_recent_delivery(headers):
+    """True if the box-delivery-timestamp header is present, valid and within MAX_DELIVERY_AGE_SECONDS."""
+    try:
+        delivered = datetime.datetime.fromisoformat(headers['box-delivery-timestamp'])
+    except (KeyError, TypeError, ValueError):
+        return False
+
+    if delivered.tzinfo is None:
+        return False
+
+    age = datetime.datetime.now(datetime.timezone.utc) - delivered
+    return age.total_seconds() <= MAX_DELIVERY_AGE_SECONDS
+
+def _matches(body, headers, credentials):
+    for key_name, header_name in (('primary_key', 'box-signature-primary'), ('secondary_key', 'box-signature-secondary')):
+        signature = compute_signature(body, headers, credentials.get(key_name) or None)
+        expected = headers.get(header_name)
+        if signature is not None and expected is not None and hmac.compare_digest(signature, expected):
+            return True
+    return False
+
+def verify_launch(body, headers):
+    """
+    Checks a skill invocation's signatures against the cached signing keys,
+    without building any Box client. On a mismatch the keys are re-read once
+    (rate limited to KEY_REFRESH_INTERVAL_SECONDS) in case they were rotated.
+    """
+    global _last_key_refresh
+
+    # Unsigned, differently signed or stale requests never need the keys
+    if headers.get('box-signature-version') != '1' or headers.get('box-signature-algorithm') != 'HmacSHA256':
+        return False
+    if not is_recent_delivery(headers):
+        return False
 
-def get_box_credentials():
-    secret_arn = os.environ['BOX_SKILL_SECRET_ARN']
-    client = boto3.client('secretsmanager')
-    response = client.get_secret_value(SecretId=secret_arn)
-    return json.loads(response['SecretString'])
+    if _matches(body, headers, get_box_credentials()):
+        return True
+
+    with _key_refresh_lock:
+        if time.monotonic() - _last_key_refresh < KEY_REFRESH_INTERVAL_SECONDS:
+            return False
+        _last_key_refresh = time.monotonic()
+
+    return _matches(body, headers, get_box_credentials(force_refresh=True))
+
+def is_media_file(file_name):
+    """True if the file extension is one Box treats as video or audio."""
+    file_extension = os.path.splitext(file_name)[1]
+    return file_extension in box_util.box_video_formats or file_extension in box_util.box_audio_formats
 
 class box_util:
 
@@ -83,38 +157,18 @@ class box_util:
         self.logger.debug(f"client_id: {self.client_id} retrieved from secrets manager")
         
     def get_basic_client(self,token):
+        # box_sdk_gen is imported on first use to keep it out of module init
+        from box_sdk_gen import BoxClient, BoxDeveloperTokenAuth
 
         auth = BoxDeveloperTokenAuth(token=token)
 
         return BoxClient(auth)
     
     def _compute_signature(self, body, headers, signature_key):
-        if signature_key is None:
-            return None
-        if headers.get('box-signature-version') != '1':
-            return None
-        if headers.get('box-signature-algorithm') != 'HmacSHA256':
-            return None
-
-        encoded_signature_key = signature_key.encode('utf-8')
-        encoded_delivery_time_stamp = headers.get('box-delivery-timestamp').encode('utf-8')
-        new_hmac = hmac.new(encoded_signature_key, digestmod=hashlib.sha256)
-        new_hmac.update(body + encoded_delivery_time_stamp)
-        signature = base64.b64encode(new_hmac.digest()).decode()
-        return signature
+        return compute_signature(body, headers, signature_key)
     
     def is_launch_safe(self, body, headers):
-        primary_signature = self._compute_signature(body, headers, self.primary_key)
-        if primary_signature is not None and hmac.compare_digest(primary_signature, headers.get('box-signature-primary')):
-            return True
-
-        if self.secondary_key:
-            secondary_signature = self._compute_signature(body, headers, self.secondary_key)
-            if secondary_signature is not None and hmac.compare_digest(secondary_signature, headers.get('box-signature-secondary')):
-                return True
-            return False
-
-        return False
+        return _matches(body, headers, {'primary_key': self.primary_key, 'secondary_key': self.secondary_key})
 
     def is_video(self, file_type):
         return file_type in box_util.box_video_formats
@@ -123,7 +177,8 @@ class box_util:
         return file_type in box_util.box_audio_formats
     
     def get_file_contents(self,file_id):
-        
+        from box_sdk_gen import ByteStream
+
         file_content_stream: ByteStream = self.read_client.downloads.download_file(file_id=file_id)
         file_content = file_content_stream.read()
 
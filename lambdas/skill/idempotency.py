@@ -0,0 +1,79 @@
+import logging
+import os
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+CACHE_TABLE = os.environ.get('CACHE_TABLE')
+# Markers expire through the table's TTL; a redelivery after this is processed again
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24')) * 3600
+
+_table = None
+
+
+def get_table():
+    global _table
+    if _table is None:
+        _table = boto3.resource('dynamodb').Table(CACHE_TABLE)
+    return _table
+
+
+def delivery_key(request_id, file_id, version):
+    """Marker for one skill delivery of one file version."""
+    return f"delivery#{request_id}#{file_id}#{version or ''}"
+
+
+def processing_key(file_id, version):
+    """Marker for transcribing one file version, whichever delivery enqueued it."""
+    return f"transcribe#{file_id}#{version}"
+
+
+def acquire(key, ttl_seconds=IDEMPOTENCY_TTL_SECONDS):
+    """
+    Records key with a conditional put. Returns True if this caller owns the
+    key, False if an unexpired marker already exists. Without CACHE_TABLE
+    every caller owns every key.
+    """
+    if not CACHE_TABLE:
+        return True
+
+    now = int(time.time())
+    try:
+        get_table().put_item(
+            Item={'cache_key': key, 'created_at': now, 'expires_at': now + ttl_seconds},
+            # DynamoDB TTL deletes lazily, so expired markers count as absent
+            ConditionExpression="attribute_not_exists(cache_key) OR expires_at < :now",
+            ExpressionAttributeValues={':now': now}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.info(f"Duplicate of {key}, already recorded")
+            return False
+        raise
+
+
+def extend(key, ttl_seconds=IDEMPOTENCY_TTL_SECONDS):
+    """Moves an owned marker's expiry, e.g. from a short work lease to the full TTL once the work is done."""
+    if not CACHE_TABLE:
+        return
+
+    get_table().update_item(
+        Key={'cache_key': key},
+        UpdateExpression="SET expires_at = :expires_at",
+        ExpressionAttributeValues={':expires_at': int(time.time()) + ttl_seconds}
+    )
+
+
+def release(key):
+    """Removes a marker so a retry of the same work is accepted."""
+    if not CACHE_TABLE:
+        return
+
+    try:
+        get_table().delete_item(Key={'cache_key': key})
+    except ClientError as e:
+        logger.warning(f"Could not release {key}: {e}")
@@ -9,9 +9,11 @@ from pprint import pformat
 from urllib.parse import parse_qsl
 
 import box_util
+import cache_util
+import idempotency
 
 
-sqs = boto3.client('sqs')
+sqs = cache_util.get_client('sqs')
 queue_url = os.environ['QUEUE_URL']
 
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
@@ -39,79 +41,80 @@ def get_file_context(body):
     file_context['file_write_token'] = body['token']['write']['access_token']
     file_context['user_id'] = body['event']['created_by']['id']
     file_context['folder_id'] = body['source']['parent']['id']
+    file_context['file_version_id'] = (body['source'].get('file_version') or {}).get('id')
     
     return file_context
 
 
+def respond(status_code, message):
+    return {
+        "statusCode": status_code,
+        "body": message,
+        "headers": {
+            "Content-Type": "text/plain",
+        }
+    }
+
+
 def lambda_handler(event, context):
-    logger.debug(f"skill->lambda_handler: Event: " + pformat(event))
-    logger.debug(f"skill->lambda_handler: Context: " + pformat(context))
+    """
+    Acknowledges a Box skill invocation: verifies the signature against the
+    cached signing keys, checks the file type and enqueues the job. No Box
+    client is built on this path; the transcribe Lambda does the Box work.
+    Repeated deliveries of the same request and file version are
+    acknowledged without enqueueing.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"skill->lambda_handler: Event: " + pformat(event))
+        logger.debug(f"skill->lambda_handler: Context: " + pformat(context))
 
     try:
         
-        body = json.loads(event['body'])
         body_bytes = bytes(event['body'], 'utf-8')
         headers = event['headers']
 
-        file_context = get_file_context(body)
-
-        boxsdk = box_util.box_util(
-            file_context['file_read_token'],
-            file_context['file_write_token'],
-            logger
-        )
-
-        if not boxsdk.is_launch_safe(body_bytes,headers):
+        if not box_util.verify_launch(body_bytes, headers):
             message = "Launch failed signature check"
             
             logger.debug(message)
             
-            return {
-                "statusCode": 403,
-                "body": message,
-                "headers": {
-                    "Content-Type": "text/plain",
-                }
-            }
-        
-        file_name, file_extension = os.path.splitext(file_context['file_name'])
+            return respond(403, message)
 
-        if not boxsdk.is_video(file_extension) and not boxsdk.is_audio(file_extension):
+        body = json.loads(event['body'])
+
+        file_context = get_file_context(body)
+
+        if not box_util.is_media_file(file_context['file_name']):
             message = "File is not audio or video"
             logger.debug(message)
 
-            return {
-                "statusCode": 415,
-                "body": message,
-                "headers": {
-                    "Content-Type": "text/plain",
-                }
-            }
+            return respond(415, message)
         
         logger.debug("launch valid")
 
-        sqs.send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(file_context)
+        delivery_key = idempotency.delivery_key(
+            file_context['request_id'],
+            file_context['file_id'],
+            file_context['file_version_id']
         )
 
-        return {
-            "statusCode": 200,
-            "body": "Video processing started",
-            "headers": {
-                "Content-Type": "text/plain",
-            }
-        }
+        if not idempotency.acquire(delivery_key):
+            return respond(200, "Duplicate delivery ignored")
+
+        try:
+            sqs.send_message(
+                QueueUrl=queue_url,
+                MessageBody=json.dumps(file_context)
+            )
+        except Exception:
+            # Let Box's retry of this delivery through
+            idempotency.release(delivery_key)
+            raise
+
+        return respond(200, "Video processing started")
         
     except Exception as e:
         message = f"Error processing skill request: {e}"
         logger.exception(message)
 
-        
-        return {
-            'statusCode' : 500,
-            'body' : message,
-            "headers": {
-                "Content-Type": "text/plain"
-            }
-        }
\ No newline at end of file
+        return respond(500, message)
\ No newline at end of file
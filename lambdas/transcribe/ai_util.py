@@ -3,29 +3,42 @@ import json
 import os
 import uuid
 
+import cache_util
+
 class ai_util:
 
     def __init__(self):
-        self.transcribe = boto3.client("transcribe")
-        self.bedrock = boto3.client("bedrock-runtime")
-        self.s3 = boto3.client("s3")
+        self.transcribe = cache_util.get_client("transcribe")
+        self.bedrock = cache_util.get_client("bedrock-runtime")
+        self.s3 = cache_util.get_client("s3")
         self.transcribe_store = os.environ['TRANSCRIBE_BUCKET']
         self.recordings_store = os.environ['STORAGE_BUCKET']
 
-    def transcribe_file(self,file):
+    def new_job_name(self, file):
         """
-        Trascribe the meeting recording file and stores the output in a S3 bucket
+        Unique, Transcribe-safe job name derived from the media file name
         """
         temp_name_append = uuid.uuid4().hex[:6]
 
         file_name, file_extension = os.path.splitext(file)
 
+        job_name = file_name.replace(" ", "_").replace(",","").replace("&","_")
+        return f"{job_name}_{temp_name_append}"
+
+    def transcribe_file(self, file, media_key=None):
+        """
+        Trascribe the meeting recording file and stores the output in a S3 bucket.
+        media_key is the object Transcribe reads, e.g. the extracted audio
+        track; by default the recording itself.
+        """
+        media_key = media_key or file
+        file_name, file_extension = os.path.splitext(media_key)
+
         print(f"file name {file_name} extension {file_extension} media format {file_extension[1:]}")
 
-        job_name = file_name.replace(" ", "_").replace(",","").replace("&","_")
-        job_unique_name = f"{job_name}_{temp_name_append}"
+        job_unique_name = self.new_job_name(file)
 
-        job_uri = f"s3://{self.recordings_store}/{file}"
+        job_uri = f"s3://{self.recordings_store}/{media_key}"
 
         self.transcribe.start_transcription_job(
             TranscriptionJobName=job_unique_name,
@@ -3,18 +3,11 @@ import datetime
 import json
 import boto3
 
-from box_sdk_gen import (
-    BoxClient,
-    BoxDeveloperTokenAuth,
-    ByteStream,
-    read_byte_stream
-)
-
-def get_box_credentials():
-    secret_arn = os.environ['BOX_SKILL_SECRET_ARN']
-    client = boto3.client('secretsmanager')
-    response = client.get_secret_value(SecretId=secret_arn)
-    return json.loads(response['SecretString'])
+import cache_util
+
+
+def get_box_credentials(force_refresh=False):
+    return cache_util.get_secret(os.environ['BOX_SKILL_SECRET_ARN'], force_refresh)
 
 class box_util:
 
@@ -32,19 +25,27 @@ class box_util:
         self.logger.debug(f"client_id: {self.client_id} retrieved from secrets manager")
         
     def get_basic_client(self,token):
+        # box_sdk_gen is imported on first use to keep it out of module init
+        from box_sdk_gen import BoxClient, BoxDeveloperTokenAuth
 
         auth = BoxDeveloperTokenAuth(token=token)
 
         return BoxClient(auth)
     
-    def get_file_contents(self,file_id):
-
-        downloaded_file_content: ByteStream = self.read_client.downloads.download_file(
-            file_id=file_id
-        )
-
-        self.logger.debug(f"downloaded file content = {downloaded_file_content}")
-
-        file_content = read_byte_stream(downloaded_file_content)
-
-        return file_content
\ No newline at end of file
+    def get_file_sha1(self, file_id):
+        """SHA-1 of the file content as computed by Box at upload."""
+        return self.read_client.files.get_file_by_id(file_id, fields=['sha1']).sha1
+
+    def get_download_url(self, file_id):
+        """Short-lived pre-signed download URL, usable without Box credentials."""
+        return self.read_client.downloads.get_download_file_url(file_id)
+
+    def get_file_stream(self, file_id, start=None, end=None):
+        """
+        Opens a streaming download of the file, optionally limited to the byte range [start, end).
+        """
+        byte_range = None
+        if start is not None:
+            byte_range = f"bytes={start}-{'' if end is None else end - 1}"
+
+        return self.read_client.downloads.download_file(file_id=file_id, range=byte_range)
@@ -0,0 +1,50 @@
+import json
+import os
+import threading
+import time
+
+import boto3
+
+# Secrets are re-read after this long so rotated values are picked up
+SECRET_TTL_SECONDS = int(os.environ.get('SECRET_TTL_SECONDS', '300'))
+
+_lock = threading.RLock()
+_clients = {}
+_secrets = {}
+_objects = {}
+
+
+def get_client(service_name):
+    """Returns a boto3 client for the service, created once per container."""
+    with _lock:
+        if service_name not in _clients:
+            _clients[service_name] = boto3.client(service_name)
+        return _clients[service_name]
+
+
+def get_secret(secret_arn, force_refresh=False):
+    """
+    Returns the parsed JSON value of a Secrets Manager secret, cached for
+    SECRET_TTL_SECONDS. Pass force_refresh after an authentication failure
+    to pick up a rotated value immediately.
+    """
+    with _lock:
+        cached = _secrets.get(secret_arn)
+        if cached and not force_refresh and time.monotonic() - cached[0] < SECRET_TTL_SECONDS:
+            return cached[1]
+
+    response = get_client('secretsmanager').get_secret_value(SecretId=secret_arn)
+    value = json.loads(response['SecretString'])
+
+    with _lock:
+        _secrets[secret_arn] = (time.monotonic(), value)
+
+    return value
+
+
+def get_or_create(key, factory, refresh=False):
+    """Returns the object cached under key, building it with factory() on first use or when refresh is set."""
+    with _lock:
+        if refresh or key not in _objects:
+            _objects[key] = factory()
+        return _objects[key]
@@ -0,0 +1,114 @@
+import logging
+import os
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+import cache_util
+
+logger = logging.getLogger(__name__)
+
+CACHE_TABLE = os.environ.get('CACHE_TABLE')
+TRANSCRIBE_BUCKET = os.environ.get('TRANSCRIBE_BUCKET')
+RETENTION_DAYS = int(os.environ.get('MEDIA_CACHE_RETENTION_DAYS', '30'))
+
+# Cached artifacts live under this prefix; an S3 lifecycle rule expires them
+CACHE_PREFIX = "cache/"
+STATS_KEY = "media#stats"
+
+counters = {'hits': 0, 'misses': 0}
+
+_table = None
+
+
+def enabled():
+    return bool(CACHE_TABLE and TRANSCRIBE_BUCKET)
+
+
+def get_table():
+    global _table
+    if _table is None:
+        _table = boto3.resource('dynamodb').Table(CACHE_TABLE)
+    return _table
+
+
+def _cache_key(content_hash):
+    return f"media#{content_hash}"
+
+
+def _record(outcome):
+    counters[outcome] += 1
+    try:
+        get_table().update_item(
+            Key={'cache_key': STATS_KEY},
+            UpdateExpression="ADD #outcome :one",
+            ExpressionAttributeNames={'#outcome': outcome},
+            ExpressionAttributeValues={':one': 1}
+        )
+    except ClientError as e:
+        logger.warning(f"Could not update media cache counters: {e}")
+
+
+def lookup(content_hash):
+    """
+    Returns the cached transcription artifacts for a content hash, or None.
+    Entries whose artifacts have already been expired from S3 count as misses.
+    """
+    if not enabled() or not content_hash:
+        return None
+
+    item = get_table().get_item(Key={'cache_key': _cache_key(content_hash)}).get('Item')
+
+    if item and int(item.get('expires_at', 0)) > time.time():
+        s3 = cache_util.get_client('s3')
+        try:
+            s3.head_object(Bucket=TRANSCRIBE_BUCKET, Key=item['json_key'])
+            s3.head_object(Bucket=TRANSCRIBE_BUCKET, Key=item['srt_key'])
+            _record('hits')
+            logger.info(f"Media cache hit for {content_hash} ({counters})")
+            return item
+        except ClientError:
+            get_table().delete_item(Key={'cache_key': _cache_key(content_hash)})
+
+    _record('misses')
+    logger.info(f"Media cache miss for {content_hash} ({counters})")
+    return None
+
+
+def store(content_hash, json_key, srt_key):
+    """Copies a job's transcription artifacts under the cache prefix and indexes them by content hash."""
+    if not enabled() or not content_hash:
+        return
+
+    s3 = cache_util.get_client('s3')
+    cached_json_key = f"{CACHE_PREFIX}{content_hash}.json"
+    cached_srt_key = f"{CACHE_PREFIX}{content_hash}.srt"
+
+    s3.copy_object(Bucket=TRANSCRIBE_BUCKET, Key=cached_json_key, CopySource={'Bucket': TRANSCRIBE_BUCKET, 'Key': json_key})
+    s3.copy_object(Bucket=TRANSCRIBE_BUCKET, Key=cached_srt_key, CopySource={'Bucket': TRANSCRIBE_BUCKET, 'Key': srt_key})
+
+    get_table().put_item(Item={
+        'cache_key': _cache_key(content_hash),
+        'json_key': cached_json_key,
+        'srt_key': cached_srt_key,
+        'created_at': int(time.time()),
+        'expires_at': int(time.time()) + RETENTION_DAYS * 24 * 3600
+    })
+
+    logger.info(f"Cached transcription artifacts for {content_hash}")
+
+
+def restore(entry, job_unique_name):
+    """
+    Copies cached artifacts to the keys a new Transcribe job would write. The
+    .srt is copied last because its arrival starts the summarize stage.
+    """
+    s3 = cache_util.get_client('s3')
+
+    for cached_key, suffix in ((entry['json_key'], 'json'), (entry['srt_key'], 'srt')):
+        s3.copy_object(
+            Bucket=TRANSCRIBE_BUCKET,
+            Key=f"transcriptions/{job_unique_name}.{suffix}",
+            CopySource={'Bucket': TRANSCRIBE_BUCKET, 'Key': cached_key}
+        )
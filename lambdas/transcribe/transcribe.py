@@ -4,20 +4,56 @@ from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key
 import json
 import logging
+import math
 import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pprint import pformat
 from urllib.parse import parse_qsl
 
+import admission
 import box_util
 import ai_util
+import cache_util
+import idempotency
+import media_cache
 
 dynamodb = boto3.resource('dynamodb')
 
 JOB_TABLE = os.environ['JOB_TABLE']
 job_table= dynamodb.Table(JOB_TABLE)
 
-s3 = boto3.client('s3')
+s3 = cache_util.get_client('s3')
 storage_bucket = os.environ['STORAGE_BUCKET']
+queue_url = os.environ['QUEUE_URL']
+
+# Box -> S3 transfers keep at most PARTS_IN_FLIGHT parts of PART_SIZE in memory
+PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE_MB', '64')) * 1024 * 1024
+PARTS_IN_FLIGHT = int(os.environ.get('UPLOAD_PARTS_IN_FLIGHT', '4'))
+# Parts are filled in reads of at most this size, so a read never holds a second full part
+READ_CHUNK_SIZE = 1024 * 1024
+RANGED_DOWNLOAD_THRESHOLD = int(os.environ.get('RANGED_DOWNLOAD_THRESHOLD_MB', '256')) * 1024 * 1024
+# ffmpeg binary from the Lambda layer; without it the recording itself is transcribed
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', '/opt/bin/ffmpeg')
+AUDIO_PREFIX = "audio/"
+# Optionally also copy the recording to S3 for the thumbnail stage; by default
+# it reads its sampling window straight from Box
+UPLOAD_VIDEO = os.environ.get('UPLOAD_VIDEO', 'false').lower() in ('1', 'true', 'yes')
+# Job records of jobs that never finish expire through the job table's TTL
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_DAYS', '3')) * 24 * 3600
+# Records of an SQS batch processed at once; each holds up to PARTS_IN_FLIGHT parts in memory
+RECORD_WORKERS = int(os.environ.get('RECORD_WORKERS', '3'))
+# A processing marker is first held as a lease that outlives one invocation,
+# so work lost to a timeout is picked up by the SQS retry
+PROCESSING_LEASE_SECONDS = int(os.environ.get('PROCESSING_LEASE_MINUTES', '16')) * 60
+# Messages deferred while Transcribe is at capacity come back after this, doubling per deferral
+DEFER_BASE_SECONDS = int(os.environ.get('DEFER_BASE_SECONDS', '60'))
+# SQS caps message delays at 15 minutes
+MAX_DEFER_SECONDS = 900
 
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
 logger = logging.getLogger()
@@ -44,16 +80,172 @@ def get_file_context(body):
     file_context['file_write_token'] = body['file_write_token']
     file_context['user_id'] = body['user_id']
     file_context['folder_id'] = body['folder_id']
+    file_context['file_version_id'] = body.get('file_version_id')
     
     return file_context
 
-def upload_file(file_name, file_contents):
-    
-    s3_upload = s3.put_object(Bucket=storage_bucket,Key=file_name,Body=file_contents)
+def read_part(stream, size):
+    """
+    Reads up to size bytes from a stream into one preallocated buffer,
+    tolerating short reads. The buffer itself is returned, so a part is
+    held in memory once.
+    """
+    buffer = bytearray(size)
+    filled = 0
+
+    with memoryview(buffer) as view:
+        while filled < size:
+            chunk = stream.read(min(size - filled, READ_CHUNK_SIZE))
+            if not chunk:
+                break
+            view[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+
+    # Shrinks the last, short part in place
+    del buffer[filled:]
+    return buffer
+
+def upload_part(file_name, upload_id, part_number, data):
+    response = s3.upload_part(
+        Bucket=storage_bucket,
+        Key=file_name,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=data
+    )
+    return {'PartNumber': part_number, 'ETag': response['ETag']}, len(data)
+
+def transfer_stream(stream, file_name, upload_id):
+    """Reads a stream part by part, uploading up to PARTS_IN_FLIGHT parts concurrently."""
+    slots = threading.BoundedSemaphore(PARTS_IN_FLIGHT)
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=PARTS_IN_FLIGHT) as executor:
+        part_number = 1
+        while not any(f.done() and f.exception() for f in futures):
+            slots.acquire()
+            data = read_part(stream, PART_SIZE)
+
+            if not data and part_number > 1:
+                slots.release()
+                break
+
+            future = executor.submit(upload_part, file_name, upload_id, part_number, data)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+            if len(data) < PART_SIZE:
+                break
+            part_number += 1
+
+    return [f.result() for f in futures]
+
+def transfer_sequential(boxsdk, file_id, file_name, upload_id):
+    """Copies one Box download stream part by part."""
+    return transfer_stream(boxsdk.get_file_stream(file_id), file_name, upload_id)
+
+def transfer_ranged(boxsdk, file_id, file_size, file_name, upload_id):
+    """Downloads and uploads PARTS_IN_FLIGHT byte ranges of the Box file in parallel."""
+
+    def transfer(part_number):
+        start = (part_number - 1) * PART_SIZE
+        end = min(start + PART_SIZE, file_size)
+        data = read_part(boxsdk.get_file_stream(file_id, start, end), end - start)
+        return upload_part(file_name, upload_id, part_number, data)
+
+    with ThreadPoolExecutor(max_workers=PARTS_IN_FLIGHT) as executor:
+        return list(executor.map(transfer, range(1, math.ceil(file_size / PART_SIZE) + 1)))
+
+def multipart_upload(file_name, transfer):
+    """
+    Runs transfer(upload_id), which returns (part, size) results, inside an
+    S3 multipart upload of file_name and logs the throughput.
+    """
+    started = time.perf_counter()
+
+    upload_id = s3.create_multipart_upload(Bucket=storage_bucket, Key=file_name)['UploadId']
+
+    try:
+        results = transfer(upload_id)
+
+        s3.complete_multipart_upload(
+            Bucket=storage_bucket,
+            Key=file_name,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [part for part, _ in results]}
+        )
+    except Exception:
+        s3.abort_multipart_upload(Bucket=storage_bucket, Key=file_name, UploadId=upload_id)
+        raise
+
+    elapsed = time.perf_counter() - started
+    transferred = sum(size for _, size in results)
+
+    stats = {
+        'bytes': transferred,
+        'parts': len(results),
+        'seconds': round(elapsed, 2),
+        'mb_per_s': round(transferred / (1024 * 1024) / max(elapsed, 1e-6), 2)
+    }
+    logger.info(f"Transferred {file_name} to s3://{storage_bucket}: {stats}")
+
+    return stats
+
+def stream_file_to_s3(boxsdk, file_id, file_size, file_name):
+    """
+    Copies a Box file to the storage bucket through an S3 multipart upload
+    without holding more than a few parts in memory.
+    """
+    if file_size >= RANGED_DOWNLOAD_THRESHOLD:
+        return multipart_upload(file_name, lambda upload_id: transfer_ranged(boxsdk, file_id, file_size, file_name, upload_id))
+
+    return multipart_upload(file_name, lambda upload_id: transfer_sequential(boxsdk, file_id, file_name, upload_id))
+
+def audio_extraction_available():
+    return os.access(FFMPEG_PATH, os.X_OK)
+
+def extract_audio_to_s3(boxsdk, file_id, audio_key):
+    """
+    Streams the first audio track of a Box file through ffmpeg as 16 kHz
+    mono FLAC and uploads it part by part. ffmpeg reads the file over HTTP
+    from a pre-signed URL, so it can seek to an index at the end of the
+    container without the recording ever being written to disk.
+
+    ffmpeg's diagnostics go to a temporary file rather than a pipe: a damaged
+    input can log more than a pipe buffer holds while stdout is still being
+    read, which would block ffmpeg.
+    """
+    with tempfile.TemporaryFile() as error_log:
+        process = subprocess.Popen(
+            [
+                FFMPEG_PATH, '-nostdin', '-loglevel', 'error',
+                '-i', boxsdk.get_download_url(file_id),
+                '-map', '0:a:0', '-vn', '-ac', '1', '-ar', '16000',
+                '-c:a', 'flac', '-f', 'flac', 'pipe:1'
+            ],
+            stdout=subprocess.PIPE,
+            stderr=error_log
+        )
+
+        def transfer(upload_id):
+            try:
+                results = transfer_stream(process.stdout, audio_key, upload_id)
+            except Exception:
+                process.kill()
+                raise
+            finally:
+                process.stdout.close()
+                process.wait()
 
-    logger.debug(f"s3_upload {s3_upload}")
+            if process.returncode != 0:
+                error_log.seek(0)
+                # The last lines name the failure; earlier ones are usually repeated decode errors
+                errors = error_log.read().decode(errors='replace').strip()[-2000:]
+                raise RuntimeError(f"ffmpeg exited with {process.returncode}: {errors}")
 
-    return s3_upload
+            return results
+
+        return multipart_upload(audio_key, transfer)
 
 def write_job(job_id, job_uri, file_context):
     
@@ -70,7 +262,9 @@ def write_job(job_id, job_uri, file_context):
                 'file_read_token': file_context['file_read_token'],
                 'file_write_token': file_context['file_write_token'],
                 'user_id': file_context['user_id'],
-                'folder_id': file_context['folder_id']
+                'folder_id': file_context['folder_id'],
+                'expires_at': int(time.time()) + JOB_RETENTION_SECONDS,
+                **{key: file_context[key] for key in ('content_sha1', 'cache_hit', 'holds_slot') if file_context.get(key)}
             }
         )
         logger.info(f"Job {job_id} successfully added")
@@ -83,56 +277,188 @@ def write_job(job_id, job_uri, file_context):
         logger.exception(f"Error writing job_id {job_id} - {e}")
         raise
 
-def lambda_handler(event, context):
-    logger.debug(f"transcribe->lambda_handler: Event: " + pformat(event))
-    logger.debug(f"transcribe->lambda_handler: Context: " + pformat(context))
+def defer(record, reason):
+    """
+    Puts a record back on the queue with a delay instead of failing it, so
+    bursts wait for Transcribe capacity rather than draining into the DLQ.
+    """
+    body = json.loads(record['body'])
+    body['deferrals'] = body.get('deferrals', 0) + 1
+
+    delay = min(DEFER_BASE_SECONDS * 2 ** (body['deferrals'] - 1), MAX_DEFER_SECONDS)
+    # Jitter spreads deferred records so they do not return as one burst
+    delay = int(delay * random.uniform(0.5, 1.0))
+
+    cache_util.get_client('sqs').send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps(body),
+        DelaySeconds=delay
+    )
+    logger.info(f"Deferred message {record['messageId']} by {delay}s (deferral {body['deferrals']}): {reason}")
+
+def process_record(ai, record):
+    body = record['body']
+
+    logger.debug("Body: " + str(body))
+
+    data = json.loads(body)
+
+    file_context = get_file_context(data)
+    file_context['sqs_message_id'] = record['messageId']
+
+    boxsdk = box_util.box_util(
+        file_context['file_read_token'],
+        file_context['file_write_token'],
+        logger
+    )
+
+    file_context['content_sha1'] = boxsdk.get_file_sha1(file_context['file_id'])
+
+    # Different deliveries of the same file version are transcribed once; the
+    # content hash identifies the version when the delivery did not carry one
+    processing_key = idempotency.processing_key(
+        file_context['file_id'],
+        file_context['file_version_id'] or file_context['content_sha1']
+    )
+
+    if not idempotency.acquire(processing_key, PROCESSING_LEASE_SECONDS):
+        logger.info(f"Skipping duplicate delivery of {file_context['file_name']} ({processing_key})")
+        return None
 
     try:
-        
-        for record in event['Records']:
-            body = record['body']
+        job_id = start_transcription(ai, boxsdk, file_context)
+    except admission.CapacityFull as e:
+        # The deferred copy of this message must not look like a duplicate
+        idempotency.release(processing_key)
+        defer(record, e)
+        return None
+    except Exception:
+        # Let the SQS retry of this message start the work again
+        idempotency.release(processing_key)
+        raise
 
-            logger.debug("Body: " + str(body))
+    idempotency.extend(processing_key)
 
-            data = json.loads(body)
-    
-            file_context = get_file_context(data)
-            file_context['sqs_message_id'] = record['messageId']
+    return job_id
 
-            boxsdk = box_util.box_util(
-                file_context['file_read_token'],
-                file_context['file_write_token'],
-                logger
-            )
+def start_transcription(ai, boxsdk, file_context):
+    # Re-uploads and copies of a recording reuse its earlier transcription
+    cached = media_cache.lookup(file_context['content_sha1'])
+
+    if cached:
+        job_id = ai.new_job_name(file_context['file_name'])
+        file_context['cache_hit'] = True
+
+        write_job(job_id, f"s3://{storage_bucket}/{file_context['file_name']}", file_context)
+        media_cache.restore(cached, job_id)
+
+        logger.info(f"Skipped upload and transcription for {file_context['file_name']}, reusing cached job {job_id}")
+        return job_id
+
+    # Defer before moving any media when Transcribe is already at capacity
+    admission.check_capacity()
 
-            file_content = boxsdk.get_file_contents(file_context['file_id'])
+    return upload_and_transcribe(ai, boxsdk, file_context)
+
+def start_job(ai, file_context, media_key=None):
+    """
+    Takes a Transcribe job slot and starts the job. The slot is taken only
+    now, once the media is in place, so the in-flight counter only ever
+    counts started jobs and reconciling it against Transcribe is exact. The
+    summarize Lambda returns the slot when the transcription arrives.
+    """
+    admission.acquire()
+
+    try:
+        job_id, job_uri = ai.transcribe_file(file_context['file_name'], media_key=media_key)
+    except ClientError as e:
+        admission.release()
+        if e.response['Error']['Code'] == 'LimitExceededException':
+            raise admission.CapacityFull(f"Transcribe rejected the job: {e}") from e
+        raise
+    except Exception:
+        admission.release()
+        raise
+
+    file_context['holds_slot'] = True
+
+    return job_id, job_uri
+
+def upload_and_transcribe(ai, boxsdk, file_context):
+    if not audio_extraction_available():
+        logger.warning(f"{FFMPEG_PATH} not found, transcribing the full recording")
+
+        upload = stream_file_to_s3(
+            boxsdk,
+            file_context['file_id'],
+            int(file_context['file_size'] or 0),
+            file_context['file_name']
+        )
 
-            upload = upload_file(file_context['file_name'], file_content)
+        logger.debug(f"upload results: {upload}")
+
+        job_id, job_uri = start_job(ai, file_context)
+
+        write_job(job_id, job_uri, file_context)
+
+        return job_id
+
+    # Only the audio track goes to Transcribe
+    audio_key = f"{AUDIO_PREFIX}{os.path.splitext(file_context['file_name'])[0]}.flac"
+    upload = extract_audio_to_s3(boxsdk, file_context['file_id'], audio_key)
+
+    logger.debug(f"audio upload results: {upload}")
+
+    if UPLOAD_VIDEO:
+        # Copied before the job starts, so the summarize Lambda can never
+        # delete it while the upload is still running. It reads from Box if
+        # the copy is missing, so a failed copy does not fail the job.
+        try:
+            upload = stream_file_to_s3(
+                boxsdk,
+                file_context['file_id'],
+                int(file_context['file_size'] or 0),
+                file_context['file_name']
+            )
 
             logger.debug(f"upload results: {upload}")
+        except Exception as e:
+            logger.warning(f"Could not copy {file_context['file_name']} for thumbnails: {e}")
 
-            ai = ai_util.ai_util()
+    job_id, job_uri = start_job(ai, file_context, media_key=audio_key)
 
-            job_id, job_uri = ai.transcribe_file(file_context['file_name'])
+    write_job(job_id, job_uri, file_context)
 
-            write_job(job_id, job_uri, file_context)
+    return job_id
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps({"message": "Transcription started"}),
-            "headers": {
-                "Content-Type": "application/json",
-            }
-        }
-        
-    except Exception as e:
-        message = f"Error transcribing file: {e}"
-        logger.exception(message)
-
-        return {
-            'statusCode' : 200,
-            'body' : message,
-            "headers": {
-                "Content-Type": "text/plain"
-            }
-        }
\ No newline at end of file
+def lambda_handler(event, context):
+    """
+    Processes the records of an SQS batch concurrently, at most
+    RECORD_WORKERS at a time. Failed records are reported back through
+    batchItemFailures so SQS retries only those messages.
+    """
+    logger.debug(f"transcribe->lambda_handler: Event: " + pformat(event))
+    logger.debug(f"transcribe->lambda_handler: Context: " + pformat(context))
+
+    records = event.get('Records', [])
+    batch_item_failures = []
+
+    if not records:
+        return {"batchItemFailures": batch_item_failures}
+
+    ai = cache_util.get_or_create('ai_util', ai_util.ai_util)
+
+    with ThreadPoolExecutor(max_workers=min(RECORD_WORKERS, len(records))) as executor:
+        futures = {executor.submit(process_record, ai, record): record['messageId'] for record in records}
+
+        for future in as_completed(futures):
+            message_id = futures[future]
+            try:
+                logger.info(f"Message {message_id}: job {future.result() or 'skipped or deferred'}")
+            except Exception as e:
+                logger.exception(f"Error transcribing file for message {message_id}: {e}")
+                batch_item_failures.append({"itemIdentifier": message_id})
+
+    logger.info(f"Processed {len(records)} records, {len(batch_item_failures)} failed")
+
+    return {"batchItemFailures": batch_item_failures}
@@ -1,7 +1,14 @@
 import pytest
 import os
+import sys
+import importlib
 from unittest.mock import patch
 
+LAMBDAS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambdas')
+
+# Modules that exist, with different contents, in more than one Lambda
+SHARED_MODULES = ('admission', 'ai_util', 'box_util', 'cache_util', 'idempotency', 'media_cache')
+
 @pytest.fixture(autouse=True)
 def mock_app_config():
     """Mock app_config module for all tests"""
@@ -29,4 +36,29 @@ def mock_app_config():
     with patch.dict('sys.modules', {
         'app_config': type('MockModule', (), mock_config)()
     }):
-        yield
\ No newline at end of file
+        yield
+
+
+@pytest.fixture
+def aws_env(monkeypatch):
+    """Fake credentials and region, so moto intercepts every boto3 call"""
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.delenv('AWS_PROFILE', raising=False)
+
+
+@pytest.fixture
+def load_lambda(monkeypatch):
+    """
+    Imports a module from lambdas/<lambda_name>, fresh for each test. Modules
+    shared by name between Lambdas are dropped first so the right copy is
+    used; mock_app_config restores sys.modules afterwards.
+    """
+    def load(lambda_name, module_name):
+        monkeypatch.syspath_prepend(os.path.join(LAMBDAS_DIR, lambda_name))
+        for name in SHARED_MODULES + (module_name,):
+            sys.modules.pop(name, None)
+        return importlib.import_module(module_name)
+
+    return load
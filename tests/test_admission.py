@@ -0,0 +1,122 @@
+import boto3
+import pytest
+from moto import mock_dynamodb
+
+LIMIT = 3
+
+
+class FakeTranscribe:
+    """list_transcription_jobs paginator reporting a set number of queued and running jobs."""
+
+    def __init__(self, queued=0, in_progress=0):
+        self.jobs = {'QUEUED': queued, 'IN_PROGRESS': in_progress}
+
+    def get_paginator(self, operation_name):
+        assert operation_name == 'list_transcription_jobs'
+        return self
+
+    def paginate(self, Status):
+        # Two pages, as a long listing would have
+        jobs = [{'TranscriptionJobName': f"{Status}-{i}"} for i in range(self.jobs[Status])]
+        return [{'TranscriptionJobSummaries': jobs[:1]}, {'TranscriptionJobSummaries': jobs[1:]}]
+
+
+# Both Lambdas ship their own copy of admission.py
+@pytest.fixture(params=['transcribe', 'process'])
+def admission(request, aws_env, monkeypatch, load_lambda):
+    monkeypatch.setenv('JOB_TABLE', 'jobs')
+
+    with mock_dynamodb():
+        boto3.resource('dynamodb').create_table(
+            TableName='jobs',
+            KeySchema=[{'AttributeName': 'job_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'job_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        module = load_lambda(request.param, 'admission')
+        # The first reconcile in a test is never rate limited
+        monkeypatch.setattr(module, '_last_reconcile', float('-inf'))
+        yield module
+
+
+def use_transcribe(monkeypatch, admission, **jobs):
+    transcribe = FakeTranscribe(**jobs)
+    monkeypatch.setattr(admission.cache_util, 'get_client', lambda service_name: transcribe)
+    return transcribe
+
+
+def in_flight(admission):
+    item = admission.get_table().get_item(Key=admission.COUNTER_KEY).get('Item') or {}
+    return int(item.get('in_flight', 0))
+
+
+def test_acquire_up_to_the_limit(monkeypatch, admission):
+    use_transcribe(monkeypatch, admission, queued=1, in_progress=2)
+
+    for _ in range(LIMIT):
+        admission.acquire(LIMIT)
+
+    # Transcribe confirms every slot is in use, so the next one is refused
+    with pytest.raises(admission.CapacityFull):
+        admission.acquire(LIMIT)
+    assert in_flight(admission) == LIMIT
+
+
+def test_reconcile_is_rate_limited(monkeypatch, admission):
+    use_transcribe(monkeypatch, admission)
+
+    assert admission.reconcile() == 0
+    assert admission.reconcile() is None
+
+
+def test_reconcile_recovers_leaked_slots(monkeypatch, admission):
+    # Three slots were taken by jobs that failed and never released them
+    for _ in range(LIMIT):
+        admission.acquire(LIMIT)
+    use_transcribe(monkeypatch, admission, in_progress=1)
+
+    admission.acquire(LIMIT)
+
+    assert in_flight(admission) == 2
+
+
+def test_check_capacity_does_not_take_a_slot(monkeypatch, admission):
+    use_transcribe(monkeypatch, admission, in_progress=LIMIT)
+
+    admission.check_capacity(LIMIT)
+    assert in_flight(admission) == 0
+
+    for _ in range(LIMIT):
+        admission.acquire(LIMIT)
+    with pytest.raises(admission.CapacityFull):
+        admission.check_capacity(LIMIT)
+    assert in_flight(admission) == LIMIT
+
+
+def test_release_never_goes_below_zero(admission):
+    admission.acquire(LIMIT)
+
+    admission.release()
+    admission.release()
+
+    assert in_flight(admission) == 0
+
+
+def test_release_job_releases_its_slot_once(admission):
+    admission.acquire(LIMIT)
+    admission.acquire(LIMIT)
+    admission.get_table().put_item(Item={'job_id': 'job-1', 'holds_slot': True})
+
+    assert admission.release_job('job-1')
+    assert not admission.release_job('job-1')
+
+    assert in_flight(admission) == 1
+
+
+def test_release_job_without_a_slot(admission):
+    admission.acquire(LIMIT)
+    # Jobs restored from the media cache never held a slot
+    admission.get_table().put_item(Item={'job_id': 'job-1', 'cache_hit': True})
+
+    assert not admission.release_job('job-1')
+    assert in_flight(admission) == 1
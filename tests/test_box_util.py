@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeTable:
+    """The get_item/put_item subset of a DynamoDB table, optionally failing every call."""
+
+    def __init__(self, error=None):
+        self.items = {}
+        self.error = error
+
+    def get_item(self, Key):
+        if self.error:
+            raise self.error
+        item = self.items.get(Key['cache_key'])
+        return {'Item': item} if item else {}
+
+    def put_item(self, Item):
+        if self.error:
+            raise self.error
+        self.items[Item['cache_key']] = Item
+
+
+@pytest.fixture
+def box_util(load_lambda):
+    return load_lambda('process', 'box_util')
+
+
+@pytest.fixture
+def ai_cache(box_util, monkeypatch):
+    cache = box_util.AiResponseCache(max_entries=2, ttl_seconds=3600, table_name='cache')
+    cache._table = FakeTable()
+    monkeypatch.setattr(box_util, 'ai_response_cache', cache)
+    return cache
+
+
+class AiCalls:
+    """Stands in for the Box AI request, returning answers in turn and counting calls."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def __call__(self, content, prompt, agent_id, ai_file_id):
+        self.calls += 1
+        return self.answers.pop(0)
+
+
+def bare_box(box_util, client=None):
+    # Built without __init__, so no Box credentials or token are needed
+    box = object.__new__(box_util.box_util)
+    box.logger = logging.getLogger('test')
+    box.client = client
+    return box
+
+
+def box_with_ai(box_util, calls):
+    box = bare_box(box_util)
+    box._ask_box_ai = calls
+    return box
+
+
+def test_lru_evicts_the_least_recently_used_entry(box_util):
+    cache = box_util.AiResponseCache(max_entries=2, table_name=None)
+
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_expired_entries_are_not_returned(box_util):
+    cache = box_util.AiResponseCache(ttl_seconds=-1, table_name=None)
+    cache.put('a', 1)
+
+    assert cache.get('a') is None
+
+
+def test_table_backs_the_container_cache(box_util, ai_cache):
+    ai_cache.put('a', {'title': 'Agents'})
+    ai_cache.clear()
+
+    assert ai_cache.get('a') == {'title': 'Agents'}
+    assert json.loads(ai_cache._table.items['a']['response']) == {'title': 'Agents'}
+
+
+def test_expired_table_items_are_ignored(box_util, ai_cache):
+    ai_cache._table.items['a'] = {'cache_key': 'a', 'response': '"stale"', 'expires_at': int(time.time()) - 1}
+
+    assert ai_cache.get('a') is None
+
+
+def test_answers_are_served_from_the_cache(box_util, ai_cache):
+    calls = AiCalls('blog post')
+    box = box_with_ai(box_util, calls)
+
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') == 'blog post'
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') == 'blog post'
+    assert calls.calls == 1
+
+
+def test_failed_calls_are_not_cached(box_util, ai_cache):
+    calls = AiCalls(None, 'blog post')
+    box = box_with_ai(box_util, calls)
+
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') is None
+    assert ai_cache._table.items == {}
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') == 'blog post'
+    assert calls.calls == 2
+
+
+def test_bypass_skips_the_cached_answer_but_stores_the_fresh_one(box_util, ai_cache, monkeypatch):
+    box = box_with_ai(box_util, AiCalls('first', 'second'))
+    box.ask_box_ai('transcript', 'write a blog', 'agent', 'file')
+
+    monkeypatch.setattr(box_util, 'AI_CACHE_BYPASS', True)
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') == 'second'
+
+    monkeypatch.setattr(box_util, 'AI_CACHE_BYPASS', False)
+    ai_cache.clear()
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') == 'second'
+
+
+def test_table_errors_never_fail_the_call(box_util, ai_cache):
+    from botocore.exceptions import ClientError
+
+    ai_cache._table.error = ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}}, 'GetItem')
+    calls = AiCalls('blog post', 'blog post again')
+    box = box_with_ai(box_util, calls)
+
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') == 'blog post'
+    # The container tier still caches the answer when the table cannot
+    assert box.ask_box_ai('transcript', 'write a blog', 'agent', 'file') == 'blog post'
+    assert calls.calls == 1
+
+
+class FakeChunkedUploads:
+    """Records the calls of a Box chunked upload session."""
+
+    def __init__(self, part_size):
+        self.part_size = part_size
+        self.parts = []
+        self.commit = None
+
+    def create_file_upload_session(self, folder_id, file_size, file_name):
+        self.session = (folder_id, file_size, file_name)
+        return SimpleNamespace(id='session-1', part_size=self.part_size)
+
+    def upload_file_part(self, upload_session_id, request_body, digest, content_range):
+        data = request_body.read()
+        self.parts.append({'data': data, 'digest': digest, 'content_range': content_range})
+        offset = int(content_range.split()[1].split('-')[0])
+        return SimpleNamespace(part={'part_id': f"part-{offset}", 'offset': offset, 'size': len(data)})
+
+    def create_file_upload_session_commit(self, upload_session_id, parts, digest):
+        self.commit = {'session': upload_session_id, 'parts': parts, 'digest': digest}
+        return SimpleNamespace(to_dict=lambda: {'entries': [{'id': 'file-1', 'type': 'file'}]})
+
+
+def sha1_header(data):
+    return "sha=" + base64.b64encode(hashlib.sha1(data).digest()).decode()
+
+
+@pytest.mark.parametrize('size', [40, 41, 59])
+def test_chunked_upload_splits_parts_at_the_session_part_size(box_util, monkeypatch, size):
+    monkeypatch.setattr(box_util, 'CHUNKED_UPLOAD_THRESHOLD', 16)
+    uploads = FakeChunkedUploads(part_size=10)
+    box = bare_box(box_util, SimpleNamespace(chunked_uploads=uploads))
+    data = bytes(range(size))
+
+    assert box.upload_file('thumbnail.jpg', data, 7) == {'id': 'file-1', 'type': 'file'}
+
+    assert uploads.session == ('7', size, 'thumbnail.jpg')
+    # Parts are sent in parallel, so they are matched up by their range
+    parts = {part['content_range']: part for part in uploads.parts}
+    assert len(parts) == len(range(0, size, 10))
+    for offset in range(0, size, 10):
+        chunk = data[offset:offset + 10]
+        part = parts[f"bytes {offset}-{offset + len(chunk) - 1}/{size}"]
+        assert part['data'] == chunk
+        assert part['digest'] == sha1_header(chunk)
+
+    # Parts are committed in file order, with the digest of the whole file
+    assert [part['offset'] for part in uploads.commit['parts']] == list(range(0, size, 10))
+    assert uploads.commit['digest'] == sha1_header(data)
+
+
+def test_small_uploads_skip_the_session(box_util, monkeypatch):
+    monkeypatch.setattr(box_util, 'CHUNKED_UPLOAD_THRESHOLD', 16)
+    uploads = FakeChunkedUploads(part_size=10)
+    uploaded = SimpleNamespace(to_dict=lambda: {'entries': [{'id': 'file-2'}]})
+    box = bare_box(box_util, SimpleNamespace(
+        chunked_uploads=uploads,
+        uploads=SimpleNamespace(upload_file=lambda attributes, stream: uploaded)
+    ))
+
+    assert box.upload_file('captions.srt', 'short text', 7) == {'id': 'file-2'}
+    assert uploads.parts == []
@@ -0,0 +1,155 @@
+import json
+import time
+
+import boto3
+import pytest
+from moto import mock_dynamodb, mock_sqs
+
+
+def create_cache_table():
+    return boto3.resource('dynamodb').create_table(
+        TableName='cache',
+        KeySchema=[{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def expire(table, key):
+    """Backdates a marker the way an expired one looks before TTL deletes it."""
+    table.update_item(
+        Key={'cache_key': key},
+        UpdateExpression="SET expires_at = :expired",
+        ExpressionAttributeValues={':expired': int(time.time()) - 1}
+    )
+
+
+# The skill and transcribe Lambdas ship their own copy of idempotency.py
+@pytest.fixture(params=['skill', 'transcribe'])
+def idempotency(request, aws_env, monkeypatch, load_lambda):
+    monkeypatch.setenv('CACHE_TABLE', 'cache')
+
+    with mock_dynamodb():
+        table = create_cache_table()
+        module = load_lambda(request.param, 'idempotency')
+        module.table = table
+        yield module
+
+
+def test_acquire_once(idempotency):
+    assert idempotency.acquire('delivery#1')
+    assert not idempotency.acquire('delivery#1')
+    assert idempotency.acquire('delivery#2')
+
+
+def test_expired_marker_is_claimed_again(idempotency):
+    assert idempotency.acquire('delivery#1')
+    expire(idempotency.table, 'delivery#1')
+
+    assert idempotency.acquire('delivery#1')
+    assert not idempotency.acquire('delivery#1')
+
+
+def test_extend_moves_a_lease_to_the_full_ttl(idempotency):
+    assert idempotency.acquire('transcribe#1#v1', ttl_seconds=60)
+
+    idempotency.extend('transcribe#1#v1')
+
+    item = idempotency.table.get_item(Key={'cache_key': 'transcribe#1#v1'})['Item']
+    assert int(item['expires_at']) >= int(time.time()) + idempotency.IDEMPOTENCY_TTL_SECONDS - 5
+
+
+def test_release_lets_the_work_be_claimed_again(idempotency):
+    assert idempotency.acquire('transcribe#1#v1')
+
+    idempotency.release('transcribe#1#v1')
+
+    assert idempotency.acquire('transcribe#1#v1')
+
+
+def test_without_a_table_every_caller_owns_every_key(idempotency, monkeypatch):
+    monkeypatch.setattr(idempotency, 'CACHE_TABLE', None)
+
+    assert idempotency.acquire('delivery#1')
+    assert idempotency.acquire('delivery#1')
+    idempotency.extend('delivery#1')
+    idempotency.release('delivery#1')
+
+
+class FlakyQueue:
+    """SQS client whose first failures sends raise."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('SQS unavailable')
+        self.messages.append(json.loads(MessageBody))
+        return {'MessageId': str(len(self.messages))}
+
+
+@pytest.fixture
+def skill(aws_env, monkeypatch, load_lambda):
+    monkeypatch.setenv('CACHE_TABLE', 'cache')
+    monkeypatch.setenv('QUEUE_URL', 'https://sqs.us-east-1.amazonaws.com/000000000000/transcribe')
+    monkeypatch.setenv('BOX_SKILL_SECRET_ARN', 'skill-secret')
+
+    with mock_dynamodb(), mock_sqs():
+        table = create_cache_table()
+        module = load_lambda('skill', 'skill')
+        monkeypatch.setattr(module.box_util, 'verify_launch', lambda body, headers: True)
+        module.sqs = FlakyQueue()
+        module.table = table
+        yield module
+
+
+def skill_event(request_id='request-1', version_id='v1'):
+    return {
+        'headers': {},
+        'body': json.dumps({
+            'id': request_id,
+            'skill': {'id': 'skill-1'},
+            'source': {'id': '1234', 'name': 'keynote.mp4', 'size': 1024, 'parent': {'id': '0'}, 'file_version': {'id': version_id}},
+            'token': {'read': {'access_token': 'read'}, 'write': {'access_token': 'write'}},
+            'event': {'created_by': {'id': '42'}}
+        })
+    }
+
+
+def test_duplicate_delivery_is_acknowledged_without_enqueueing(skill):
+    assert skill.lambda_handler(skill_event(), None)['statusCode'] == 200
+
+    response = skill.lambda_handler(skill_event(), None)
+
+    assert response['statusCode'] == 200
+    assert response['body'] == "Duplicate delivery ignored"
+    assert len(skill.sqs.messages) == 1
+
+
+def test_new_file_version_is_enqueued(skill):
+    skill.lambda_handler(skill_event(version_id='v1'), None)
+    skill.lambda_handler(skill_event(version_id='v2'), None)
+
+    assert [message['file_version_id'] for message in skill.sqs.messages] == ['v1', 'v2']
+
+
+def test_delivery_is_enqueued_again_after_its_marker_expires(skill):
+    skill.lambda_handler(skill_event(), None)
+    expire(skill.table, skill.idempotency.delivery_key('request-1', '1234', 'v1'))
+
+    assert skill.lambda_handler(skill_event(), None)['statusCode'] == 200
+    assert len(skill.sqs.messages) == 2
+
+
+def test_retry_after_a_failed_enqueue_is_accepted(skill):
+    skill.sqs.failures = 1
+
+    assert skill.lambda_handler(skill_event(), None)['statusCode'] == 500
+    assert skill.sqs.messages == []
+
+    # Box retries the delivery; the marker was released, so it is enqueued
+    assert skill.lambda_handler(skill_event(), None)['statusCode'] == 200
+    assert len(skill.sqs.messages) == 1
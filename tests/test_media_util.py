@@ -0,0 +1,171 @@
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambdas', 'process'))
+
+import media_util
+
+
+def box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode()) + payload
+
+
+def full_box(box_type, payload, version=0):
+    return box(box_type, struct.pack(">B3x", version) + payload)
+
+
+def mvhd(timescale, duration, version=0):
+    if version == 1:
+        return full_box("mvhd", struct.pack(">QQIQ", 0, 0, timescale, duration) + bytes(80), version=1)
+    return full_box("mvhd", struct.pack(">IIII", 0, 0, timescale, duration) + bytes(80))
+
+
+def trak(timescale, sample_delta, sizes, samples_per_chunk, chunk_offsets, co64=False):
+    stts = full_box("stts", struct.pack(">III", 1, len(sizes), sample_delta))
+    stsc = full_box("stsc", struct.pack(">IIII", 1, 1, samples_per_chunk, 1))
+    stsz = full_box("stsz", struct.pack(f">II{len(sizes)}I", 0, len(sizes), *sizes))
+    if co64:
+        stco = full_box("co64", struct.pack(f">I{len(chunk_offsets)}Q", len(chunk_offsets), *chunk_offsets))
+    else:
+        stco = full_box("stco", struct.pack(f">I{len(chunk_offsets)}I", len(chunk_offsets), *chunk_offsets))
+
+    mdhd = full_box("mdhd", struct.pack(">IIII", 0, 0, timescale, sample_delta * len(sizes)) + bytes(4))
+    stbl = box("stbl", stts + stsc + stsz + stco)
+    return box("trak", box("mdia", mdhd + box("minf", stbl)))
+
+
+def build_movie(co64=False):
+    """
+    A 10 second movie with interleaved chunks: video at 1 sample/s, two
+    100 byte samples per chunk, and audio at 2 samples/s, four 10 byte
+    samples per chunk. moov sits at the end, after the single mdat.
+    """
+    ftyp = box("ftyp", b"isom" + bytes(4))
+    mdat_body = b""
+    video_offsets, audio_offsets = [], []
+    base = len(ftyp) + 8
+
+    for index in range(5):
+        video_offsets.append(base + len(mdat_body))
+        mdat_body += bytes([index + 1]) * 200
+        audio_offsets.append(base + len(mdat_body))
+        mdat_body += bytes([index + 101]) * 40
+
+    moov = box("moov", mvhd(1000, 10000)
+               + trak(1000, 1000, [100] * 10, 2, video_offsets, co64=co64)
+               + trak(100, 50, [10] * 20, 4, audio_offsets, co64=co64))
+
+    return ftyp + box("mdat", mdat_body) + moov, base
+
+
+def fetcher(data, reads=None):
+    def fetch_range(start, end):
+        if reads is not None:
+            reads.append((start, end))
+        yield data[start:end]
+    return fetch_range
+
+
+def test_read_mp4_boxes_lists_top_level_boxes():
+    data, _ = build_movie()
+
+    boxes = media_util.read_mp4_boxes(fetcher(data), len(data))
+
+    assert [box_type for box_type, _, _ in boxes] == ["ftyp", "mdat", "moov"]
+    assert boxes[-1][1] + boxes[-1][2] == len(data)
+
+
+def test_read_mp4_boxes_stops_once_moov_and_mdat_are_found():
+    data = build_movie()[0] + box("free", bytes(8)) * 50
+    reads = []
+
+    boxes = media_util.read_mp4_boxes(fetcher(data, reads), len(data))
+
+    assert [box_type for box_type, _, _ in boxes] == ["ftyp", "mdat", "moov"]
+    assert len(reads) == 3
+
+
+def fragmented_movie(fragments):
+    ftyp = box("ftyp", b"iso6" + bytes(4))
+    moov = box("moov", mvhd(1000, 0))
+    return ftyp + moov + (box("moof", bytes(16)) + box("mdat", bytes(64))) * fragments
+
+
+def test_read_mp4_boxes_stops_at_the_first_fragment(tmp_path):
+    data = fragmented_movie(1000)
+    reads = []
+
+    assert not media_util.write_sampling_window(fetcher(data, reads), len(data), str(tmp_path / "window.mp4"), 3)
+
+    assert len(reads) == 3
+
+
+def test_read_mp4_boxes_caps_header_probes():
+    data = box("ftyp", b"isom" + bytes(4)) + box("free", bytes(8)) * 1000
+    reads = []
+
+    boxes = media_util.read_mp4_boxes(fetcher(data, reads), len(data), max_probes=10)
+
+    assert len(boxes) == len(reads) == 10
+
+
+def test_read_mp4_boxes_stops_at_non_box_data():
+    assert media_util.read_mp4_boxes(fetcher(b"not an mp4 file at all"), 22) == []
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_parse_movie_duration(version):
+    moov = box("moov", mvhd(600, 600 * 90, version=version))
+
+    assert media_util.parse_movie_duration(moov) == 90
+
+
+def test_parse_movie_duration_without_mvhd():
+    assert media_util.parse_movie_duration(box("moov", b"")) is None
+
+
+@pytest.mark.parametrize("co64", [False, True])
+def test_window_byte_end_covers_every_track(co64):
+    data, base = build_movie(co64=co64)
+    moov = data[data.index(b"moov") - 4:]
+
+    end = media_util.window_byte_end(moov, 3, *media_util.find_child_box(moov, "moov"))
+
+    # Video samples 0-2 end inside the second video chunk (base + 240 + 100),
+    # audio samples 0-5 inside the second audio chunk (base + 440 + 20)
+    assert end == base + 460
+
+
+def test_write_sampling_window_fetches_only_the_window(tmp_path):
+    data, base = build_movie()
+    dest = tmp_path / "window.mp4"
+    reads = []
+
+    assert media_util.write_sampling_window(fetcher(data, reads), len(data), str(dest), 3)
+
+    written = dest.read_bytes()
+    moov_offset = data.index(b"moov") - 4
+    assert len(written) == len(data)
+    assert written[:base + 460] == data[:base + 460]
+    assert written[moov_offset:] == data[moov_offset:]
+    assert written[base + 460:moov_offset] == bytes(moov_offset - base - 460)
+    assert (0, base + 460) in reads
+
+
+def test_write_sampling_window_ignores_a_later_mdat(tmp_path):
+    data, base = build_movie()
+    # A trailing mdat must not move the window, which the sample tables fix
+    data += box("mdat", bytes(1000))
+
+    assert media_util.write_sampling_window(fetcher(data), len(data), str(tmp_path / "window.mp4"), 3)
+
+    assert (tmp_path / "window.mp4").read_bytes()[:base + 460] == data[:base + 460]
+
+
+def test_write_sampling_window_rejects_files_without_sample_tables(tmp_path):
+    data = box("ftyp", b"isom" + bytes(4)) + box("mdat", bytes(100)) + box("moov", mvhd(1000, 10000))
+
+    assert not media_util.write_sampling_window(fetcher(data), len(data), str(tmp_path / "window.mp4"), 3)
@@ -0,0 +1,129 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambdas', 'process'))
+
+from pipeline import Stage, StageError, critical_path, run_stages, stages_to_run
+
+
+def job_stages(calls=None):
+    """transcript -> (summary, blog) -> doc, with summary and blog checkpointed."""
+    def stage(name, value):
+        def func(inputs):
+            if calls is not None:
+                calls.append(name)
+            return {'value': value, 'inputs': sorted(inputs)}
+        return func
+
+    return [
+        Stage('transcript', stage('transcript', 't')),
+        Stage('summary', stage('summary', 's'), depends_on=['transcript'], checkpoint=True),
+        Stage('blog', stage('blog', 'b'), depends_on=['transcript'], checkpoint=True),
+        Stage('doc', stage('doc', 'd'), depends_on=['summary', 'blog'])
+    ]
+
+
+def test_stages_to_run_fresh_run_runs_everything():
+    assert stages_to_run(job_stages(), {}) == {'transcript', 'summary', 'blog', 'doc'}
+
+
+def test_stages_to_run_skips_checkpointed_stages_and_unneeded_dependencies():
+    # Only doc is left, and it needs nothing that has not been checkpointed
+    assert stages_to_run(job_stages(), {'summary': {}, 'blog': {}}) == {'doc'}
+
+
+def test_stages_to_run_reruns_uncheckpointed_dependencies_of_incomplete_stages():
+    assert stages_to_run(job_stages(), {'summary': {}}) == {'transcript', 'blog', 'doc'}
+
+
+def test_run_stages_passes_dependency_outputs():
+    outputs, timeline = run_stages(job_stages())
+
+    assert outputs['doc'] == {'value': 'd', 'inputs': ['blog', 'summary']}
+    assert outputs['summary']['inputs'] == ['transcript']
+    assert sorted(entry['stage'] for entry in timeline) == ['blog', 'doc', 'summary', 'transcript']
+
+
+def test_run_stages_resumes_from_completed_outputs():
+    calls = []
+    completed = {'summary': {'value': 'cached'}, 'blog': {'value': 'cached'}}
+
+    outputs, _ = run_stages(job_stages(calls), completed=completed)
+
+    assert calls == ['doc']
+    assert outputs['summary'] == {'value': 'cached'}
+
+
+def test_run_stages_ignores_completed_outputs_of_unknown_stages():
+    outputs, _ = run_stages(job_stages(), completed={'retired': {}})
+
+    assert 'retired' not in outputs
+
+
+def test_run_stages_reports_each_finished_stage():
+    finished = []
+
+    run_stages(job_stages(), completed={'summary': {}}, on_complete=lambda name, output: finished.append(name))
+
+    assert sorted(finished) == ['blog', 'doc', 'transcript']
+    assert finished[-1] == 'doc'
+
+
+def test_run_stages_overlaps_independent_stages():
+    # summary and blog each wait for the other to start, so this only
+    # finishes when they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    stages = [
+        Stage('summary', lambda inputs: barrier.wait()),
+        Stage('blog', lambda inputs: barrier.wait())
+    ]
+
+    outputs, _ = run_stages(stages, max_workers=2)
+
+    assert set(outputs) == {'summary', 'blog'}
+
+
+def test_run_stages_raises_stage_error_with_timeline():
+    def fail(inputs):
+        raise RuntimeError('model unavailable')
+
+    stages = [Stage('transcript', lambda inputs: 't'), Stage('summary', fail, depends_on=['transcript'])]
+
+    with pytest.raises(StageError) as raised:
+        run_stages(stages)
+
+    assert raised.value.stage == 'summary'
+    assert isinstance(raised.value.error, RuntimeError)
+    assert [entry['stage'] for entry in raised.value.timeline] == ['transcript', 'summary']
+
+
+def test_run_stages_rejects_unknown_dependencies():
+    with pytest.raises(ValueError):
+        run_stages([Stage('summary', lambda inputs: None, depends_on=['missing'])])
+
+
+def test_run_stages_rejects_cycles():
+    stages = [
+        Stage('a', lambda inputs: None, depends_on=['b']),
+        Stage('b', lambda inputs: None, depends_on=['a']),
+        Stage('doc', lambda inputs: None, depends_on=['a'])
+    ]
+
+    with pytest.raises(ValueError):
+        run_stages(stages)
+
+
+def test_critical_path_follows_latest_dependency():
+    stages = job_stages()
+    timeline = [
+        {'stage': 'transcript', 'start': 0, 'end': 1, 'seconds': 1},
+        {'stage': 'summary', 'start': 1, 'end': 2, 'seconds': 1},
+        {'stage': 'blog', 'start': 1, 'end': 5, 'seconds': 4},
+        {'stage': 'doc', 'start': 5, 'end': 6, 'seconds': 1}
+    ]
+
+    assert critical_path(stages, timeline) == ['transcript', 'blog', 'doc']
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from moto import mock_dynamodb
+
+JOB_ID = 'job-1'
+
+CREDENTIALS = {
+    'ai_file_id': 'ai-file',
+    'metadata_template_key': 'template-key',
+    'blog_agent_id': 'blog-agent',
+    'tweet_agent_id': 'tweet-agent',
+    'linkedin_agent_id': 'linkedin-agent',
+    'youtube_agent_id': 'youtube-agent',
+    'template_id': 'template'
+}
+
+AI_OUTPUT = {
+    'metadata': {'title': 'Agents on Box'},
+    'blog': 'blog',
+    'tweet': 'tweet',
+    'linkedin': 'linkedin',
+    'youtube_description': 'youtube'
+}
+
+
+@pytest.fixture
+def process(aws_env, monkeypatch, load_lambda):
+    monkeypatch.setenv('JOB_TABLE', 'jobs')
+    monkeypatch.setenv('STORAGE_BUCKET', 'recordings')
+    monkeypatch.setenv('TRANSCRIBE_BUCKET', 'transcriptions')
+
+    with mock_dynamodb():
+        table = boto3.resource('dynamodb').create_table(
+            TableName='jobs',
+            KeySchema=[{'AttributeName': 'job_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'job_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table.put_item(Item={
+            'job_id': JOB_ID, 'job_uri': f"s3://recordings/{JOB_ID}.mp4", 'request_id': 'request-1',
+            'skill_id': 'skill-1', 'file_id': '11', 'file_name': 'talk.mp4', 'file_size': 1024,
+            'folder_id': '22', 'file_read_token': 'read', 'file_write_token': 'write', 'user_id': '33'
+        })
+        yield load_lambda('process', 'process')
+
+
+def stage(process, job_data, box, name):
+    stages = process.build_stages('talk.mp4', job_data, box, MagicMock(), 'video-link', 'srt-link', CREDENTIALS)
+    return next(stage for stage in stages if stage.name == name)
+
+
+def docgen_box(wait_results, status='pending'):
+    box = MagicMock()
+    box.generate_document.return_value = 'batch-1'
+    box.wait_for_document.side_effect = wait_results
+    box.check_document.return_value = (status, None)
+    return box
+
+
+def test_docgen_retry_collects_the_batch_instead_of_generating_again(process):
+    box = docgen_box([None, 'file-9'])
+
+    with pytest.raises(Exception):
+        stage(process, process.get_job_data(JOB_ID), box, 'docgen').func({'ai': AI_OUTPUT})
+
+    # The retry reloads the job record, which holds the batch id
+    job_data = process.get_job_data(JOB_ID)
+    assert job_data['checkpoints']['docgen_batch'] == 'batch-1'
+
+    assert stage(process, job_data, box, 'docgen').func({'ai': AI_OUTPUT}) == 'file-9'
+    box.generate_document.assert_called_once()
+    assert box.generate_document.call_args.kwargs['wait'] is False
+    assert [call.args[0] for call in box.wait_for_document.call_args_list] == ['batch-1', 'batch-1']
+
+
+def test_failed_docgen_batch_is_started_again_on_retry(process):
+    box = docgen_box([None], status='failed')
+
+    with pytest.raises(Exception):
+        stage(process, process.get_job_data(JOB_ID), box, 'docgen').func({'ai': AI_OUTPUT})
+
+    assert 'docgen_batch' not in process.get_job_data(JOB_ID)['checkpoints']
+
+
+def ai_box(results):
+    box = MagicMock()
+    box.run_ai_requests.return_value = results
+    return box
+
+
+def test_partial_ai_output_fails_the_stage_before_the_last_attempt(process):
+    job_data = process.get_job_data(JOB_ID)
+    assert not process.record_attempt(job_data)
+
+    box = ai_box({**AI_OUTPUT, 'blog': None})
+
+    with pytest.raises(Exception):
+        stage(process, job_data, box, 'ai').func({'transcript': ('talk', 'talk')})
+
+
+def test_last_attempt_builds_the_document_from_partial_ai_output(process):
+    job_data = process.get_job_data(JOB_ID)
+    attempts = [process.record_attempt(job_data) for _ in range(process.MAX_ATTEMPTS)]
+    assert attempts == [False] * (process.MAX_ATTEMPTS - 1) + [True]
+
+    partial = {**AI_OUTPUT, 'metadata': None, 'blog': None}
+    box = ai_box(partial)
+
+    assert stage(process, job_data, box, 'ai').func({'transcript': ('talk', 'talk')}) == partial
+
+    # A partial output is never checkpointed
+    process.save_checkpoint(job_data, 'ai', partial)
+    assert 'ai' not in process.get_job_data(JOB_ID)['checkpoints']
+
+    box = docgen_box(['file-9'])
+    assert stage(process, job_data, box, 'docgen').func({'ai': partial}) == 'file-9'
+    assert box.create_docgen_json.call_args.kwargs['title'] == 'unknown'
+    assert box.create_docgen_json.call_args.kwargs['blog'] == ''
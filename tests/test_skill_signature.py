@@ -0,0 +1,162 @@
+import base64
+import datetime
+import hashlib
+import hmac
+from types import SimpleNamespace
+
+import pytest
+
+PRIMARY_KEY = 'primary-signing-key'
+SECONDARY_KEY = 'secondary-signing-key'
+BODY = b'{"id": "request-1", "source": {"id": "1234", "name": "keynote.mp4"}}'
+
+
+class FakeSecrets:
+    """Serves the skill secret, and a rotated one once a refresh is forced."""
+
+    def __init__(self, credentials, rotated=None):
+        self.credentials = credentials
+        self.rotated = rotated
+        self.refreshes = 0
+
+    def get_secret(self, secret_arn, force_refresh=False):
+        if force_refresh:
+            self.refreshes += 1
+            if self.rotated:
+                self.credentials = self.rotated
+        return self.credentials
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def box_util(monkeypatch, load_lambda):
+    monkeypatch.setenv('BOX_SKILL_SECRET_ARN', 'skill-secret')
+    module = load_lambda('skill', 'box_util')
+
+    clock = Clock()
+    monkeypatch.setattr(module, 'time', clock)
+    monkeypatch.setattr(module, '_last_key_refresh', clock.now)
+    module.clock = clock
+    return module
+
+
+def use_secrets(monkeypatch, box_util, credentials, rotated=None):
+    secrets = FakeSecrets(credentials, rotated)
+    monkeypatch.setattr(box_util.cache_util, 'get_secret', secrets.get_secret)
+    return secrets
+
+
+def sign(key, timestamp, body=BODY):
+    digest = hmac.new(key.encode(), body + timestamp.encode(), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def signed_headers(primary=PRIMARY_KEY, secondary=SECONDARY_KEY, age_seconds=0):
+    delivered = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=age_seconds)
+    timestamp = delivered.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    return {
+        'box-signature-version': '1',
+        'box-signature-algorithm': 'HmacSHA256',
+        'box-delivery-timestamp': timestamp,
+        'box-signature-primary': sign(primary, timestamp),
+        'box-signature-secondary': sign(secondary, timestamp)
+    }
+
+
+CREDENTIALS = {'client_id': 'skill', 'primary_key': PRIMARY_KEY, 'secondary_key': SECONDARY_KEY}
+
+
+def test_primary_key_match(monkeypatch, box_util):
+    use_secrets(monkeypatch, box_util, CREDENTIALS)
+
+    assert box_util.verify_launch(BODY, signed_headers(secondary='wrong'))
+
+
+def test_secondary_key_match(monkeypatch, box_util):
+    use_secrets(monkeypatch, box_util, CREDENTIALS)
+
+    assert box_util.verify_launch(BODY, signed_headers(primary='wrong'))
+
+
+def test_bad_signature(monkeypatch, box_util):
+    use_secrets(monkeypatch, box_util, CREDENTIALS)
+
+    assert not box_util.verify_launch(BODY, signed_headers(primary='wrong', secondary='wrong'))
+    assert not box_util.verify_launch(BODY + b' ', signed_headers())
+
+
+@pytest.mark.parametrize('header', [
+    'box-signature-primary',
+    'box-signature-version',
+    'box-signature-algorithm',
+    'box-delivery-timestamp'
+])
+def test_missing_header(monkeypatch, box_util, header):
+    use_secrets(monkeypatch, box_util, {**CREDENTIALS, 'secondary_key': None})
+    headers = signed_headers()
+    del headers[header]
+
+    assert not box_util.verify_launch(BODY, headers)
+
+
+def test_missing_both_signatures(monkeypatch, box_util):
+    use_secrets(monkeypatch, box_util, CREDENTIALS)
+    headers = signed_headers()
+    del headers['box-signature-primary'], headers['box-signature-secondary']
+
+    assert not box_util.verify_launch(BODY, headers)
+
+
+def test_expired_timestamp(monkeypatch, box_util):
+    secrets = use_secrets(monkeypatch, box_util, CREDENTIALS)
+
+    assert box_util.verify_launch(BODY, signed_headers(age_seconds=box_util.MAX_DELIVERY_AGE_SECONDS - 60))
+    assert not box_util.verify_launch(BODY, signed_headers(age_seconds=box_util.MAX_DELIVERY_AGE_SECONDS + 60))
+    assert secrets.refreshes == 0
+
+
+def test_invalid_timestamp(monkeypatch, box_util):
+    use_secrets(monkeypatch, box_util, CREDENTIALS)
+    headers = signed_headers()
+    headers['box-delivery-timestamp'] = 'yesterday'
+    headers['box-signature-primary'] = sign(PRIMARY_KEY, 'yesterday')
+
+    assert not box_util.verify_launch(BODY, headers)
+
+
+def test_rotated_keys_are_picked_up_by_a_forced_refresh(monkeypatch, box_util):
+    rotated = {**CREDENTIALS, 'primary_key': 'rotated-key'}
+    secrets = use_secrets(monkeypatch, box_util, CREDENTIALS, rotated=rotated)
+    box_util.clock.now += box_util.KEY_REFRESH_INTERVAL_SECONDS
+
+    assert box_util.verify_launch(BODY, signed_headers(primary='rotated-key', secondary='wrong'))
+    assert secrets.refreshes == 1
+
+
+def test_forced_refresh_at_most_once_per_interval(monkeypatch, box_util):
+    secrets = use_secrets(monkeypatch, box_util, CREDENTIALS)
+    bad = signed_headers(primary='wrong', secondary='wrong')
+
+    # A new container read the keys at import, so it does not refresh at once
+    assert not box_util.verify_launch(BODY, bad)
+    assert secrets.refreshes == 0
+
+    box_util.clock.now += box_util.KEY_REFRESH_INTERVAL_SECONDS
+    for _ in range(20):
+        assert not box_util.verify_launch(BODY, bad)
+    assert secrets.refreshes == 1
+
+    box_util.clock.now += box_util.KEY_REFRESH_INTERVAL_SECONDS - 1
+    assert not box_util.verify_launch(BODY, bad)
+    assert secrets.refreshes == 1
+
+    box_util.clock.now += 1
+    assert not box_util.verify_launch(BODY, bad)
+    assert secrets.refreshes == 2
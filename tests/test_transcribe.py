@@ -0,0 +1,307 @@
+import json
+import threading
+import time
+
+import boto3
+import pytest
+from moto import mock_dynamodb, mock_sqs
+
+
+@pytest.fixture
+def transcribe(aws_env, monkeypatch, load_lambda):
+    monkeypatch.setenv('JOB_TABLE', 'jobs')
+    monkeypatch.setenv('STORAGE_BUCKET', 'recordings')
+    monkeypatch.setenv('TRANSCRIBE_BUCKET', 'transcriptions')
+    monkeypatch.delenv('CACHE_TABLE', raising=False)
+
+    with mock_dynamodb(), mock_sqs():
+        boto3.resource('dynamodb').create_table(
+            TableName='jobs',
+            KeySchema=[{'AttributeName': 'job_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'job_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        queue_url = boto3.client('sqs').create_queue(QueueName='transcribe')['QueueUrl']
+        monkeypatch.setenv('QUEUE_URL', queue_url)
+
+        yield load_lambda('transcribe', 'transcribe')
+
+
+def record(message_id, **body):
+    message = {
+        'request_id': f"request-{message_id}", 'skill_id': 'skill-1', 'file_id': f"file-{message_id}",
+        'file_name': f"{message_id}.mp4", 'file_size': 1024, 'file_read_token': 'read',
+        'file_write_token': 'write', 'user_id': '42', 'folder_id': '7', **body
+    }
+    return {'messageId': message_id, 'body': json.dumps(message)}
+
+
+def queued_messages(transcribe):
+    response = boto3.client('sqs').receive_message(
+        QueueUrl=transcribe.queue_url, MaxNumberOfMessages=10, AttributeNames=['All']
+    )
+    return response.get('Messages', [])
+
+
+class FakeBox:
+    def __init__(self, read_token, write_token, logger):
+        pass
+
+    def get_file_sha1(self, file_id):
+        return f"sha1-{file_id}"
+
+
+def test_handler_reports_only_failed_records(transcribe, monkeypatch):
+    def process_record(ai, record):
+        if record['messageId'] in ('m2', 'm4'):
+            raise RuntimeError('Box download failed')
+        return f"job-{record['messageId']}"
+
+    monkeypatch.setattr(transcribe, 'process_record', process_record)
+
+    result = transcribe.lambda_handler({'Records': [record(f"m{i}") for i in range(1, 6)]}, None)
+
+    assert sorted(failure['itemIdentifier'] for failure in result['batchItemFailures']) == ['m2', 'm4']
+
+
+def test_handler_does_not_report_deferred_records(transcribe, monkeypatch):
+    def start_transcription(ai, boxsdk, file_context):
+        if file_context['file_id'] == 'file-m1':
+            raise transcribe.admission.CapacityFull('100 Transcribe jobs already in flight')
+        if file_context['file_id'] == 'file-m3':
+            raise RuntimeError('Box download failed')
+        return 'job-1'
+
+    monkeypatch.setattr(transcribe.box_util, 'box_util', FakeBox)
+    monkeypatch.setattr(transcribe, 'start_transcription', start_transcription)
+    # Deferred messages come straight back, so the test can receive them
+    monkeypatch.setattr(transcribe, 'DEFER_BASE_SECONDS', 0)
+
+    result = transcribe.lambda_handler({'Records': [record('m1'), record('m2'), record('m3')]}, None)
+
+    assert result['batchItemFailures'] == [{'itemIdentifier': 'm3'}]
+
+    # The deferred record is back on the queue, not in the failures
+    deferred = queued_messages(transcribe)
+    assert len(deferred) == 1
+    assert json.loads(deferred[0]['Body'])['file_id'] == 'file-m1'
+
+
+def test_handler_with_no_records(transcribe):
+    assert transcribe.lambda_handler({'Records': []}, None) == {'batchItemFailures': []}
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, **kwargs):
+        self.sent.append(kwargs)
+
+
+def test_defer_backs_off_exponentially_up_to_the_sqs_limit(transcribe, monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(transcribe.cache_util, 'get_client', lambda service_name: queue)
+    # Without jitter the delay is the full backoff
+    monkeypatch.setattr(transcribe.random, 'uniform', lambda low, high: high)
+
+    message = record('m1')
+    for _ in range(6):
+        transcribe.defer(message, 'at capacity')
+        message = {'messageId': 'm1', 'body': queue.sent[-1]['MessageBody']}
+
+    assert [sent['DelaySeconds'] for sent in queue.sent] == [60, 120, 240, 480, 900, 900]
+    assert json.loads(queue.sent[-1]['MessageBody'])['deferrals'] == 6
+    assert all(sent['QueueUrl'] == transcribe.queue_url for sent in queue.sent)
+
+
+def test_defer_jitter_stays_within_half_the_backoff(transcribe, monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(transcribe.cache_util, 'get_client', lambda service_name: queue)
+
+    for _ in range(50):
+        transcribe.defer(record('m1', deferrals=2), 'at capacity')
+
+    assert all(120 <= sent['DelaySeconds'] <= 240 for sent in queue.sent)
+
+
+@pytest.fixture
+def processing_markers(transcribe, monkeypatch):
+    table = boto3.resource('dynamodb').create_table(
+        TableName='cache',
+        KeySchema=[{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    monkeypatch.setattr(transcribe.idempotency, 'CACHE_TABLE', 'cache')
+    monkeypatch.setattr(transcribe.box_util, 'box_util', FakeBox)
+    return table
+
+
+def test_failed_record_releases_its_processing_lease(transcribe, monkeypatch, processing_markers):
+    def start_transcription(ai, boxsdk, file_context):
+        raise RuntimeError('Box download failed')
+
+    monkeypatch.setattr(transcribe, 'start_transcription', start_transcription)
+
+    with pytest.raises(RuntimeError):
+        transcribe.process_record(None, record('m1', file_version_id='v1'))
+
+    assert 'Item' not in processing_markers.get_item(Key={'cache_key': 'transcribe#file-m1#v1'})
+
+
+def test_started_record_extends_its_processing_lease(transcribe, monkeypatch, processing_markers):
+    monkeypatch.setattr(transcribe, 'start_transcription', lambda ai, boxsdk, file_context: 'job-1')
+
+    assert transcribe.process_record(None, record('m1', file_version_id='v1')) == 'job-1'
+    # A redelivery of the same version is skipped
+    assert transcribe.process_record(None, record('m1', file_version_id='v1')) is None
+
+    marker = processing_markers.get_item(Key={'cache_key': 'transcribe#file-m1#v1'})['Item']
+    assert int(marker['expires_at']) > int(time.time()) + transcribe.PROCESSING_LEASE_SECONDS
+
+
+class ShortReadStream:
+    """A download stream that returns fewer bytes than asked for, as network reads do."""
+
+    def __init__(self, data, max_read=3):
+        self.data = data
+        self.position = 0
+        self.max_read = max_read
+
+    def read(self, size):
+        chunk = self.data[self.position:self.position + min(size, self.max_read)]
+        self.position += len(chunk)
+        return chunk
+
+
+class FakeS3:
+    """Multipart upload calls, recording each part and how many were in flight at once."""
+
+    def __init__(self, fail_part=None):
+        self.parts = {}
+        self.fail_part = fail_part
+        self.completed = None
+        self.aborted = False
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {'UploadId': 'upload-1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.01)
+            if PartNumber == self.fail_part:
+                raise RuntimeError('part upload failed')
+            self.parts[PartNumber] = bytes(Body)
+            return {'ETag': f"etag-{PartNumber}"}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.completed = MultipartUpload['Parts']
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+@pytest.fixture
+def small_parts(transcribe, monkeypatch):
+    monkeypatch.setattr(transcribe, 'PART_SIZE', 10)
+    monkeypatch.setattr(transcribe, 'READ_CHUNK_SIZE', 4)
+    monkeypatch.setattr(transcribe, 'PARTS_IN_FLIGHT', 2)
+    s3 = FakeS3()
+    monkeypatch.setattr(transcribe, 's3', s3)
+    return s3
+
+
+def upload_stream(transcribe, data):
+    return transcribe.multipart_upload('talk.mp4', lambda upload_id: transcribe.transfer_stream(ShortReadStream(data), 'talk.mp4', upload_id))
+
+
+@pytest.mark.parametrize('size', [1, 9, 10, 11, 25, 40])
+def test_transfer_stream_splits_parts_at_part_size(transcribe, small_parts, size):
+    data = bytes(range(size))
+
+    stats = upload_stream(transcribe, data)
+
+    parts = [small_parts.parts[number] for number in sorted(small_parts.parts)]
+    # Every part but the last is exactly PART_SIZE; the last may be shorter
+    assert all(len(part) == 10 for part in parts[:-1])
+    assert 0 < len(parts[-1]) <= 10
+    assert b"".join(parts) == data
+    assert small_parts.completed == [{'PartNumber': n, 'ETag': f"etag-{n}"} for n in range(1, len(parts) + 1)]
+    assert stats['bytes'] == size and stats['parts'] == len(parts)
+
+
+def test_transfer_stream_of_an_empty_stream(transcribe, small_parts):
+    upload_stream(transcribe, b"")
+
+    assert small_parts.parts == {1: b""}
+    assert small_parts.completed == [{'PartNumber': 1, 'ETag': 'etag-1'}]
+
+
+def test_transfer_stream_holds_at_most_parts_in_flight(transcribe, small_parts, monkeypatch):
+    # A part is held from the read that fills it until its upload returns
+    held = []
+    read_part = transcribe.read_part
+
+    def counted_read_part(stream, size):
+        with small_parts.lock:
+            held.append(len(held) + 1 - len(small_parts.parts))
+        return read_part(stream, size)
+
+    monkeypatch.setattr(transcribe, 'read_part', counted_read_part)
+
+    upload_stream(transcribe, bytes(200))
+
+    assert len(small_parts.parts) == 20
+    assert small_parts.max_active <= transcribe.PARTS_IN_FLIGHT
+    assert max(held) <= transcribe.PARTS_IN_FLIGHT
+
+
+def test_failed_part_aborts_the_upload(transcribe, small_parts):
+    small_parts.fail_part = 2
+
+    with pytest.raises(RuntimeError):
+        upload_stream(transcribe, bytes(100))
+
+    assert small_parts.aborted
+    assert small_parts.completed is None
+
+
+class RangedBox:
+    def __init__(self, data):
+        self.data = data
+        self.ranges = []
+
+    def get_file_stream(self, file_id, start=None, end=None):
+        self.ranges.append((start, end))
+        return ShortReadStream(self.data[start:end])
+
+
+def test_transfer_ranged_reassembles_the_file(transcribe, small_parts):
+    data = bytes(range(95))
+    box = RangedBox(data)
+
+    transcribe.multipart_upload('talk.mp4', lambda upload_id: transcribe.transfer_ranged(box, 'file-1', len(data), 'talk.mp4', upload_id))
+
+    assert sorted(box.ranges) == [(start, min(start + 10, 95)) for start in range(0, 95, 10)]
+    assert b"".join(small_parts.parts[number] for number in sorted(small_parts.parts)) == data
+    assert len(small_parts.parts[10]) == 5
+    assert small_parts.max_active <= transcribe.PARTS_IN_FLIGHT
+
+
+def test_read_part_fills_the_part_across_short_reads(transcribe, small_parts):
+    stream = ShortReadStream(bytes(range(25)))
+
+    assert transcribe.read_part(stream, 10) == bytes(range(10))
+    assert transcribe.read_part(stream, 10) == bytes(range(10, 20))
+    assert transcribe.read_part(stream, 10) == bytes(range(20, 25))
+    assert transcribe.read_part(stream, 10) == b""
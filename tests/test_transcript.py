@@ -0,0 +1,188 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'process'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from transcript import create_transcript_with_seconds, split_transcript_windows, stream_transcribe_output
+from transcript_bench import legacy_create_transcript_with_seconds, synthetic_items
+
+
+def word(content, start_time):
+    return {'type': 'pronunciation', 'start_time': start_time, 'alternatives': [{'content': content}]}
+
+
+def punctuation(content):
+    return {'type': 'punctuation', 'alternatives': [{'content': content}]}
+
+
+ITEMS = [
+    word('Bonjour', '0.5'),
+    word('à', '0.9'),
+    word('tous', '1.2'),
+    punctuation('.'),
+    word('Ünïcödé', '61.0'),
+    word('“quoted”', '61.75')
+]
+
+
+def transcribe_output(items=ITEMS, job_name='meeting-1'):
+    return json.dumps({
+        'jobName': job_name,
+        'accountId': '000000000000',
+        'results': {
+            'transcripts': [{'transcript': 'Bonjour à tous. Ünïcödé “quoted”'}],
+            'items': items
+        },
+        'status': 'COMPLETED'
+    }, ensure_ascii=False).encode('utf-8')
+
+
+def chunked(data, size):
+    return (data[index:index + size] for index in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_stream_transcribe_output_matches_json_loads(chunk_size):
+    data = transcribe_output()
+
+    transcript, items = stream_transcribe_output(chunked(data, chunk_size))
+
+    document = json.loads(data)
+    assert transcript == document['results']['transcripts'][0]['transcript']
+    assert list(items) == document['results']['items']
+
+
+def test_stream_transcribe_output_ignores_decoy_keys_in_strings():
+    data = transcribe_output(job_name='"items": [1, 2], "results": {}')
+
+    transcript, items = stream_transcribe_output(chunked(data, 5))
+
+    assert transcript.startswith('Bonjour')
+    assert [item['alternatives'][0]['content'] for item in items][:3] == ['Bonjour', 'à', 'tous']
+
+
+def test_stream_transcribe_output_reads_numbers_split_across_chunks():
+    data = json.dumps({'results': {'transcripts': [], 'items': [12345, 6.25, {'n': 987654321}]}}).encode()
+
+    _, items = stream_transcribe_output(chunked(data, 2))
+
+    assert list(items) == [12345, 6.25, {'n': 987654321}]
+
+
+@pytest.mark.parametrize("split_after", ['[12', '[12.', '[12.5, 3', '300000.', '300000.0e', '300000.0e+', '-', '-7'])
+def test_stream_transcribe_output_reads_numbers_split_at_any_character(split_after):
+    data = b'{"results": {"transcripts": [], "items": [12.5, 300000.0e+2, -7]}}'
+    cut = data.index(split_after.encode()) + len(split_after)
+
+    _, items = stream_transcribe_output([data[:cut], data[cut:]])
+
+    assert list(items) == [12.5, 300000.0e+2, -7]
+
+
+def test_stream_transcribe_output_decodes_items_lazily():
+    data = transcribe_output()
+    reads = []
+
+    def chunks():
+        for chunk in chunked(data, 16):
+            reads.append(len(chunk))
+            yield chunk
+
+    _, items = stream_transcribe_output(chunks())
+    read_before_items = len(reads)
+    next(items)
+
+    assert sum(reads) < len(data)
+    assert len(reads) > read_before_items
+
+
+def test_stream_transcribe_output_without_results():
+    transcript, items = stream_transcribe_output([b'{"jobName": "meeting-1", "status": "FAILED"}'])
+
+    assert transcript == ""
+    assert list(items) == []
+
+
+def test_stream_transcribe_output_rejects_truncated_documents():
+    data = transcribe_output()
+
+    _, items = stream_transcribe_output(chunked(data[:-60], 8))
+
+    with pytest.raises(ValueError):
+        list(items)
+
+
+def test_transcript_matches_the_original_builder():
+    items = synthetic_items(5)
+
+    assert create_transcript_with_seconds(items) == legacy_create_transcript_with_seconds(items)
+    assert create_transcript_with_seconds(ITEMS) == legacy_create_transcript_with_seconds(ITEMS)
+
+
+def test_transcript_lines_carry_the_previous_lines_second():
+    assert create_transcript_with_seconds(ITEMS) == "Bonjour à \n00:00 tous . \n00:01 Ünïcödé “quoted” "
+
+
+def test_streamed_items_build_the_same_transcript():
+    data = transcribe_output()
+
+    _, items = stream_transcribe_output(chunked(data, 3))
+
+    assert create_transcript_with_seconds(items) == create_transcript_with_seconds(ITEMS)
+
+
+TRANSCRIPT = "00:00 intro \n00:05 welcome everyone \n00:12 agenda \n00:20 first topic is long \n00:31 wrap up "
+
+
+def test_split_transcript_windows_keeps_a_short_transcript_whole():
+    assert split_transcript_windows(TRANSCRIPT, 10000) == [TRANSCRIPT]
+
+
+def test_split_transcript_windows_cuts_on_line_boundaries():
+    windows = split_transcript_windows(TRANSCRIPT, 40)
+
+    assert "\n".join(windows) == TRANSCRIPT
+    assert all(len(window) <= 40 for window in windows)
+    assert all(line.startswith("00:") for window in windows for line in window.split("\n"))
+
+
+def test_split_transcript_windows_overlaps_lines():
+    lines = TRANSCRIPT.split("\n")
+
+    windows = split_transcript_windows(TRANSCRIPT, 40, overlap_lines=1)
+
+    assert len(windows) > 1
+    for previous, current in zip(windows, windows[1:]):
+        assert current.split("\n")[0] == previous.split("\n")[-1]
+    assert windows[0].split("\n")[0] == lines[0]
+    assert windows[-1].split("\n")[-1] == lines[-1]
+
+
+def test_split_transcript_windows_keeps_an_oversized_line_whole():
+    line = "00:00 " + "word " * 50
+
+    assert split_transcript_windows(line + "\n00:09 end ", 20) == [line, "00:09 end "]
+
+
+def test_split_transcript_windows_never_repeats_only_the_overlap():
+    windows = split_transcript_windows(TRANSCRIPT, 40, overlap_lines=1)
+
+    # Each window adds a line the previous one did not have
+    assert windows == [
+        "00:00 intro \n00:05 welcome everyone ",
+        "00:05 welcome everyone \n00:12 agenda ",
+        "00:12 agenda \n00:20 first topic is long ",
+        "00:20 first topic is long \n00:31 wrap up "
+    ]
+
+
+def test_split_transcript_windows_always_advances_with_large_overlap():
+    windows = split_transcript_windows(TRANSCRIPT, 20, overlap_lines=10)
+
+    assert windows[-1].endswith("00:31 wrap up ")
+    assert len(windows) == len(TRANSCRIPT.split("\n"))